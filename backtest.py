@@ -0,0 +1,251 @@
+# backtest.py - replay recorded cycles through parse -> score -> signal and sweep the odds band / threshold
+#
+#   CYCLE_RECORD_DIR=recorded_cycles python main.py          # record while running live
+#   python backtest.py --cycles recorded_cycles --h2h-db h2h_cache.sqlite \
+#       --odds-min 1.05:1.20:0.01 --odds-max 1.25,1.33,1.40 --threshold 0.55:0.90:0.01
+#
+# Nothing touches the network: H2H comes from the sqlite H2H cache (H2H_CACHE_DB)
+# and team names resolve through the saved alias table. Probabilities do not depend
+# on the swept parameters, so cycles are parsed and scored once; each parameter
+# combination then replays EventStateStore.record over them in a process pool.
+import argparse
+import json
+import math
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import match_predictor
+import odds_store
+import pari_parser
+from cycle_recorder import iter_recorded
+from event_state import EventStateStore
+from pari_feed import build_live_events
+from team_resolver import TEAM_ALIASES_PATH, TeamResolver
+
+REPLAY_ODDS_MIN = 1.0
+REPLAY_ODDS_MAX = 1000.0
+
+
+class Cycle:
+    __slots__ = ("ts", "events", "odds", "probs")
+
+    def __init__(self, ts, events, odds, probs):
+        self.ts = ts
+        self.events = events  # minimal dicts: key, odds, score (what EventStateStore.record reads)
+        self.odds = odds
+        self.probs = probs
+
+
+def load_h2h(db_path: str) -> dict:
+    """Positive entries of the H2H cache sqlite file, read-only: "id1|id2" -> match list."""
+    if not db_path or not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT key, data FROM h2h WHERE negative = 0").fetchall()
+    finally:
+        conn.close()
+    return {key: json.loads(data) for key, data in rows}
+
+
+def parse_recorded(source: str, payload):
+    """Events of one recorded cycle with every priced outcome (the band is applied per combination)."""
+    if source == "html":
+        return pari_parser.parse_events_fast(payload, REPLAY_ODDS_MIN, REPLAY_ODDS_MAX)
+    events = []
+    for ev in build_live_events(payload.get("events", ()), payload.get("liveEventInfos", ()),
+                                payload.get("customFactors", ())):
+        events.extend(ev.candidates(REPLAY_ODDS_MIN, REPLAY_ODDS_MAX))
+    return events
+
+
+def prepare(cycles_dir: str, h2h_db: str, aliases: str, weights_path: str = None):
+    """Parse and score every recorded cycle once; returns (cycles, finals) where finals maps key -> last event seen."""
+    weights = match_predictor.load_weights(weights_path) if weights_path else match_predictor.WEIGHTS
+    h2h = load_h2h(h2h_db)
+    resolver = TeamResolver(path=aliases)
+    odds_store._series = odds_store.OddsSeries(path="")
+    summaries = {}
+
+    def summary(ev):
+        team1, team2 = match_predictor.event_teams(ev)
+        if not (team1 and team2):
+            return None
+        pair = (team1, team2)
+        if pair not in summaries:
+            r1, r2 = resolver.resolve(team1), resolver.resolve(team2)
+            matches = h2h.get(f"{r1.participant_id}|{r2.participant_id}") if r1 and r2 else None
+            summaries[pair] = match_predictor.h2h_summary(matches, r1, r2, team1, team2) if matches else None
+        return summaries[pair]
+
+    cycles, finals = [], {}
+    for ts, source, payload in iter_recorded(cycles_dir):
+        events = EventStateStore.assign_keys(parse_recorded(source, payload))
+        if not events:
+            continue
+        match_predictor.record_snapshots(events, now=ts)
+        probs = match_predictor.score_events(events, [summary(ev) for ev in events], weights)
+        cycles.append(Cycle(
+            ts,
+            [{"key": ev["key"], "odds": ev["odds"], "score": ev.get("score")} for ev in events],
+            np.fromiter((ev["odds"] for ev in events), dtype=np.float64, count=len(events)),
+            probs,
+        ))
+        for ev in events:
+            finals[ev["key"]] = ev
+    return cycles, finals
+
+
+def grade(finals: dict, min_final_minute: float, results_path: str = None) -> dict:
+    """
+    key -> True/False for events with a known result: the last recorded score if the
+    event was last seen at or after `min_final_minute`, overridden by a results JSON
+    ({key: true|false}).
+    """
+    results = {}
+    for key, ev in finals.items():
+        if ev.get("score") is None or match_predictor.parse_minutes(ev.get("timer")) < min_final_minute:
+            continue
+        diff = match_predictor.parse_score_diff(ev["score"], ev.get("outcome"))
+        results[key] = diff == 0 if ev.get("outcome") == "X" else diff > 0
+    if results_path:
+        with open(results_path, encoding="utf-8") as f:
+            results.update({k: bool(v) for k, v in json.load(f).items()})
+    return results
+
+
+# -- worker side ---------------------------------------------------------------
+
+_cycles = None
+_results = None
+
+
+def _init_worker(cycles, results):
+    global _cycles, _results
+    _cycles, _results = cycles, results
+
+
+def replay(params, cycles=None, results=None) -> dict:
+    """Signals for one (odds_min, odds_max, threshold, signal_delta) combination."""
+    cycles = _cycles if cycles is None else cycles
+    results = _results if results is None else results
+    odds_min, odds_max, threshold, signal_delta = params
+    store = EventStateStore(signal_delta=signal_delta)
+    signals = hits = graded = 0
+    signaled = set()
+    for cycle in cycles:
+        in_band = np.flatnonzero((cycle.odds >= odds_min) & (cycle.odds <= odds_max))
+        for i in in_band:
+            ev = cycle.events[i]
+            if store.record(ev, float(cycle.probs[i]), threshold, now=cycle.ts):
+                signals += 1
+                signaled.add(ev["key"])
+                won = results.get(ev["key"])
+                if won is not None:
+                    graded += 1
+                    hits += won
+        store.evict(now=cycle.ts)
+    return {
+        "odds_min": odds_min,
+        "odds_max": odds_max,
+        "threshold": threshold,
+        "signal_delta": signal_delta,
+        "signals": signals,
+        "events_signaled": len(signaled),
+        "graded": graded,
+        "hits": hits,
+        "hit_rate": hits / graded if graded else None,
+    }
+
+
+def _replay_chunk(chunk):
+    return [replay(p) for p in chunk]
+
+
+# -- driver --------------------------------------------------------------------
+
+def parse_grid(spec: str):
+    """"1.05,1.1" or "start:stop:step" (inclusive) -> list of floats."""
+    values = []
+    for part in spec.split(","):
+        if part.count(":") == 2:
+            start, stop, step = (float(x) for x in part.split(":"))
+            n = int(math.floor((stop - start) / step + 1e-9)) + 1
+            values.extend(round(start + i * step, 10) for i in range(max(0, n)))
+        elif part:
+            values.append(float(part))
+    return values
+
+
+def sweep(cycles, results, grid, workers: int = None, chunk_size: int = 32):
+    workers = workers or os.cpu_count() or 1
+    chunks = [grid[i:i + chunk_size] for i in range(0, len(grid), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        return [replay(p, cycles, results) for p in grid]
+    out = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cycles, results)) as pool:
+        for rows in pool.map(_replay_chunk, chunks):
+            out.extend(rows)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay recorded cycles and sweep signal parameters")
+    ap.add_argument("--cycles", required=True, help="directory written with CYCLE_RECORD_DIR")
+    ap.add_argument("--h2h-db", default=os.getenv("H2H_CACHE_DB", ""), help="sqlite H2H cache to read")
+    ap.add_argument("--aliases", default=TEAM_ALIASES_PATH)
+    ap.add_argument("--weights", help="model weights JSON (default: MODEL_WEIGHTS_PATH)")
+    ap.add_argument("--odds-min", default=str(pari_parser.ODDS_MIN))
+    ap.add_argument("--odds-max", default=str(pari_parser.ODDS_MAX))
+    ap.add_argument("--threshold", default="0.7")
+    ap.add_argument("--signal-delta", default="0.05")
+    ap.add_argument("--results", help="JSON {event key: won} overriding results taken from the last recorded score")
+    ap.add_argument("--min-final-minute", type=float, default=85.0,
+                    help="grade an event by its last recorded score only if it was last seen at this minute or later")
+    ap.add_argument("--min-signals", type=int, default=10, help="rank only combinations with this many graded signals")
+    ap.add_argument("--workers", type=int, default=0, help="processes (default: all cores)")
+    ap.add_argument("--top", type=int, default=20)
+    ap.add_argument("--out", help="write every combination as JSON here")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    cycles, finals = prepare(args.cycles, args.h2h_db, args.aliases, args.weights)
+    results = grade(finals, args.min_final_minute, args.results)
+    prepared = time.perf_counter() - t0
+    rows_total = sum(len(c.events) for c in cycles)
+    print(f"📼 {len(cycles)} cycles, {rows_total} event snapshots, {len(finals)} events, "
+          f"{len(results)} with results ({prepared:.2f}s to parse and score)")
+    if not cycles:
+        return
+
+    grid = [(lo, hi, th, d)
+            for lo in parse_grid(args.odds_min) for hi in parse_grid(args.odds_max) if lo <= hi
+            for th in parse_grid(args.threshold) for d in parse_grid(args.signal_delta)]
+    t0 = time.perf_counter()
+    rows = sweep(cycles, results, grid, args.workers or None)
+    elapsed = time.perf_counter() - t0
+    print(f"⚡ {len(grid)} combinations in {elapsed:.2f}s: {len(grid) / elapsed:.1f} combos/s, "
+          f"{len(grid) * len(cycles) / elapsed:,.0f} cycles/s, {len(grid) * rows_total / elapsed:,.0f} snapshots/s")
+
+    ranked = sorted((r for r in rows if r["graded"] >= args.min_signals),
+                    key=lambda r: (r["hit_rate"] or 0.0, r["graded"]), reverse=True)
+    if not ranked:
+        ranked = sorted(rows, key=lambda r: r["signals"], reverse=True)
+    print(f"\n{'odds_min':>8} {'odds_max':>8} {'thresh':>6} {'delta':>5} {'signals':>8} {'graded':>7} {'hit rate':>8}")
+    for r in ranked[:args.top]:
+        rate = f"{r['hit_rate']:.1%}" if r["hit_rate"] is not None else "-"
+        print(f"{r['odds_min']:8.2f} {r['odds_max']:8.2f} {r['threshold']:6.2f} {r['signal_delta']:5.2f} "
+              f"{r['signals']:8d} {r['graded']:7d} {rate:>8}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"cycles": len(cycles), "snapshots": rows_total, "seconds": elapsed, "rows": rows}, f, indent=1)
+        print(f"\n💾 {len(rows)} combinations written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# bench/fixtures.py - recorded payloads and scaled copies for benchmarks
+#
+# The files in bench/fixtures/ are trimmed samples of the three upstream formats.
+# `scaled_*` replicate their event templates to any size so benchmarks can run at
+# 10/100/1000 events; `record()` refreshes the captures from the live sites.
+import asyncio
+import copy
+import json
+import os
+import random
+import sys
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+LIVE_HTML = "pari_live_sample.html"
+EVENTS_JSON = "events_list_sample.json"
+H2H_FEED = "h2h_sample.txt"
+
+TEAMS = ["Васко да Гама", "Сантос", "Зенит", "Спартак", "Arsenal", "Chelsea", "Back D.", "Reyngold E.",
+         "Бавария", "Боруссия Д", "Flamengo", "Palmeiras", "ЦСКА", "Локомотив", "Inter", "Milan"]
+
+
+def load(name: str, mode: str = "r"):
+    with open(os.path.join(FIXTURES_DIR, name), mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+        return f.read()
+
+
+def _odds(rng: random.Random):
+    fav = round(rng.uniform(1.02, 1.6), 2)
+    return fav, round(rng.uniform(3.5, 8.0), 2), round(rng.uniform(6.0, 21.0), 2)
+
+
+def scaled_live_html(n: int, seed: int = 1) -> str:
+    """The recorded live page with its event block repeated `n` times (deterministic per seed)."""
+    page = load(LIVE_HTML)
+    head, rest = page.split("<!--EVENT-->", 1)
+    template, tail = rest.split("<!--/EVENT-->", 1)
+    rng = random.Random(seed)
+    blocks = []
+    for i in range(n):
+        t1, t2 = rng.sample(TEAMS, 2)
+        o1, ox, o2 = _odds(rng)
+        blocks.append(template.format(
+            id=41000000 + i, league=f"league-{i % 17}", team1=f"{t1} {i}", team2=f"{t2} {i}",
+            score=f"{rng.randint(0, 3)}:{rng.randint(0, 3)}", timer=f"{rng.randint(1, 89)}:{rng.randint(10, 59)}",
+            odd1=f"{o1:.2f}".replace(".", ","), oddx=f"{ox:.2f}", odd2=f"{o2:.2f}", total=f"{rng.randint(1, 4)}.5",
+        ))
+    return head + "".join(blocks) + tail
+
+
+def scaled_events_list(n: int, seed: int = 1, version: int = None) -> dict:
+    """The recorded events/list payload grown to `n` live events."""
+    base = json.loads(load(EVENTS_JSON))
+    ev_t, cf_t, info_t = base["events"][0], base["customFactors"][0], base["liveEventInfos"][0]
+    rng = random.Random(seed)
+    data = {k: v for k, v in base.items() if k not in ("events", "customFactors", "liveEventInfos")}
+    data["events"], data["customFactors"], data["liveEventInfos"] = [], [], []
+    for i in range(n):
+        eid = ev_t["id"] + i
+        t1, t2 = rng.sample(TEAMS, 2)
+        ev = copy.deepcopy(ev_t)
+        ev.update(id=eid, team1=f"{t1} {i}", team2=f"{t2} {i}")
+        cf = copy.deepcopy(cf_t)
+        cf["e"] = eid
+        for f, v in zip(cf["factors"], _odds(rng)):
+            f["v"] = v
+        info = copy.deepcopy(info_t)
+        info.update(eventId=eid, timer=f"{rng.randint(1, 89)}:00", scoreComment=f"{rng.randint(0, 3)}:{rng.randint(0, 3)}")
+        data["events"].append(ev)
+        data["customFactors"].append(cf)
+        data["liveEventInfos"].append(info)
+    if version is not None:
+        data["packetVersion"] = version
+    return data
+
+
+def h2h_feed(match_id: str = None) -> str:
+    return load(H2H_FEED)
+
+
+async def record(out_dir: str = FIXTURES_DIR):
+    """Save fresh, untrimmed captures next to the samples (needs network)."""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from http_client import fetch_text, close_http_session
+    from pari_feed import FEED_PARAMS, FEED_URL
+    from urllib.parse import urlencode
+
+    targets = {
+        "pari_live_recorded.html": ("https://pari.ru/live/", None),
+        "events_list_recorded.json": (f"{FEED_URL}?{urlencode(FEED_PARAMS)}", None),
+        "h2h_recorded.txt": ("https://d.flashscore.com/x/feed/h2h_xzFatGtA_1_en_1", {"x-fsign": "SW9D1eZo"}),
+    }
+    try:
+        for name, (url, headers) in targets.items():
+            status, text = await fetch_text(url, headers=headers)
+            path = os.path.join(out_dir, name)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            print(f"💾 {url} -> {path} ({status}, {len(text)} chars)")
+    finally:
+        await close_http_session()
+
+
+if __name__ == "__main__":
+    asyncio.run(record())
@@ -0,0 +1,219 @@
+# bench/run_bench.py - parse throughput, end-to-end cycle latency and peak memory
+#
+#   python -m bench.run_bench                       # writes bench/results/<commit>-<time>.json
+#   python -m bench.run_bench --compare bench/results/previous.json
+#
+# Everything runs against bench.standin_server, nothing touches the network.
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import time
+import tracemalloc
+
+from bench import fixtures
+from bench.standin_server import start_standin
+
+import fetcher
+import match_predictor
+import odds_store
+import pari_feed
+import pari_live
+import pari_parser
+import stats_fetcher_playwright
+from event_state import EventStateStore
+from h2h_cache import H2HCache
+from http_client import close_http_session
+from team_resolver import Resolution
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+class NullNotifier:
+    def __init__(self):
+        self.sent = 0
+
+    async def notify(self, text: str):
+        self.sent += 1
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def _best_of(fn, repeats: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def bench_parse(sizes, repeats: int):
+    engines = {"fast": pari_parser.parse_events_fast}
+    try:
+        import bs4  # noqa: F401
+        engines["legacy"] = pari_parser.parse_events_legacy
+    except ImportError:
+        print("⚠️ bs4 not installed, skipping the legacy parser")
+    out = {}
+    for name, fn in engines.items():
+        for n in sizes:
+            html = fixtures.scaled_live_html(n)
+            seconds, events = _best_of(lambda: fn(html), repeats)
+            out[f"{name}/{n}"] = {
+                "blocks": n,
+                "events": len(events),
+                "seconds": seconds,
+                "blocks_per_s": n / seconds if seconds else None,
+                "mb_per_s": len(html.encode("utf-8")) / 1e6 / seconds if seconds else None,
+            }
+            print(f"🧮 parse {name:6} n={n:5}: {seconds*1000:8.2f} ms  {n/seconds:10.0f} blocks/s")
+    return out
+
+
+async def _standin_resolve(team1, team2):
+    """Every pair resolves to a synthetic match id, so each event costs one stand-in h2h request."""
+    match_id = hashlib.md5(f"{team1}|{team2}".encode("utf-8")).hexdigest()[:8]
+    return match_id, Resolution(f"{match_id}a", team1, 1.0, "bench"), Resolution(f"{match_id}b", team2, 1.0, "bench")
+
+
+def _forget_validators():
+    """Make the next fetch a full 200 from the stand-in (ETag/Last-Modified and the feed version dropped)."""
+    pari_live.get_live_page().validators = {}
+    feed = pari_feed.get_feed()
+    feed.version = None
+    feed.validators = {}
+
+
+async def bench_cycles(sizes, sources, latency: float, error_rate: float):
+    runner, app, base_url = await start_standin(latency=latency, error_rate=error_rate)
+    stats_fetcher_playwright.FLASHSCORE_FEED_URL = f"{base_url}/x/feed/"
+    match_predictor._resolve_match = _standin_resolve
+    out = {}
+    try:
+        for source in sources:
+            fetcher.EVENT_SOURCE = source
+            for n in sizes:
+                app["events"] = n
+                pari_feed._feed = pari_feed.PariFeed(url=f"{base_url}/events/list")
+                await pari_live.close_live_page()
+                pari_live._live_page = pari_live.PariLivePage(url=f"{base_url}/live/")
+                match_predictor.h2h_cache = H2HCache(db_path="")
+                odds_store._series = odds_store.OddsSeries(path="")
+                timings = {}
+                signals = {}
+                for phase in ("cold", "warm"):
+                    # the warm run repeats the cold one with only the H2H cache kept: no 304, every event re-scored
+                    _forget_validators()
+                    notifier = NullNotifier()
+                    t0 = time.perf_counter()
+                    await fetcher.fetch_and_analyze(notifier, EventStateStore())
+                    timings[phase] = time.perf_counter() - t0
+                    signals[phase] = notifier.sent
+                out[f"{source}/{n}"] = {
+                    "events": n,
+                    "cold_seconds": timings["cold"],
+                    "warm_seconds": timings["warm"],
+                    "signals": signals["cold"],
+                    "h2h_cache": match_predictor.h2h_cache.stats(),
+                }
+                print(f"⏱ cycle {source:4} n={n:5}: cold {timings['cold']:.3f}s  warm {timings['warm']:.3f}s")
+        out["server"] = dict(app["stats"])
+    finally:
+        await close_http_session()
+        await pari_live.close_live_page()
+        await runner.cleanup()
+    return out
+
+
+async def bench_memory(n: int):
+    tracemalloc.start()
+    html = fixtures.scaled_live_html(n)
+    tracemalloc.reset_peak()
+    pari_parser.parse_events_fast(html)
+    _, parse_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    await bench_cycles([n], ["html"], latency=0.0, error_rate=0.0)
+    _, cycle_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "events": n,
+        "parse_peak_bytes": parse_peak,
+        "cycle_peak_bytes": cycle_peak,
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def _flatten(d, prefix=""):
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            yield from _flatten(v, key + ".")
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            yield key, v
+
+
+def compare(current: dict, previous_path: str):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    prev = dict(_flatten(previous.get("results", {})))
+    print(f"\n📈 vs {previous.get('commit')} ({previous_path})")
+    for key, value in _flatten(current["results"]):
+        old = prev.get(key)
+        if not old or not (key.endswith("seconds") or key.endswith("_per_s") or key.endswith("bytes")):
+            continue
+        change = (value - old) / old * 100
+        worse = change > 0 if not key.endswith("_per_s") else change < 0
+        flag = "🔴" if worse and abs(change) >= 10 else "  "
+        print(f"{flag} {key:45} {old:14.4f} -> {value:14.4f}  ({change:+.1f}%)")
+
+
+async def run(args):
+    sizes = [int(x) for x in args.sizes.split(",")]
+    results = {"parse": bench_parse(sizes, args.repeats)}
+    results["cycle"] = await bench_cycles(sizes, args.sources.split(","), args.latency, args.error_rate)
+    results["memory"] = await bench_memory(max(sizes))
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline benchmarks for the fetch pipeline")
+    ap.add_argument("--sizes", default="10,100,1000")
+    ap.add_argument("--sources", default="html,feed")
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--latency", type=float, default=0.0, help="stand-in response delay, seconds")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--out", default=RESULTS_DIR)
+    ap.add_argument("--compare", help="previous results JSON to diff against")
+    args = ap.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+        "results": asyncio.run(run(args)),
+    }
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{report['commit']}-{report['timestamp'].replace(':', '')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Results written to {path}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
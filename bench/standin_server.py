@@ -0,0 +1,105 @@
+# bench/standin_server.py - local aiohttp stand-in for pari.ru, the events/list feed and Flashscore
+#
+#   python -m bench.standin_server --port 8081 --events 500 --latency 0.05 --error-rate 0.02
+#
+# Point the worker at it with PARI_LIVE_URL=http://127.0.0.1:8081/live/,
+# PARI_FEED_URL=http://127.0.0.1:8081/events/list and FLASHSCORE_FEED_URL=http://127.0.0.1:8081/x/feed/
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+
+from aiohttp import web
+
+from bench import fixtures
+
+
+@web.middleware
+async def inject_faults(request, handler):
+    app = request.app
+    app["stats"]["requests"] += 1
+    latency = app["latency"]
+    if latency:
+        await asyncio.sleep(latency * app["rng"].uniform(0.5, 1.5))
+    if app["error_rate"] and app["rng"].random() < app["error_rate"]:
+        app["stats"]["errors"] += 1
+        return web.Response(status=503, text="injected error")
+    return await handler(request)
+
+
+def _payloads(app):
+    """Regenerate payloads only when the event count changes."""
+    n = app["events"]
+    if app["cached_n"] != n:
+        html = fixtures.scaled_live_html(n).encode("utf-8")
+        feed = json.dumps(fixtures.scaled_events_list(n, version=app["version"]), ensure_ascii=False).encode("utf-8")
+        app["payloads"] = {
+            "html": (html, '"%s"' % hashlib.md5(html).hexdigest()),
+            "feed": (feed, '"%s"' % hashlib.md5(feed).hexdigest()),
+        }
+        app["cached_n"] = n
+    return app["payloads"]
+
+
+def _conditional(request, body: bytes, etag: str, content_type: str):
+    if request.headers.get("If-None-Match") == etag:
+        request.app["stats"]["not_modified"] += 1
+        return web.Response(status=304, headers={"ETag": etag})
+    request.app["stats"]["bytes"] += len(body)
+    return web.Response(body=body, content_type=content_type, charset="utf-8", headers={"ETag": etag})
+
+
+async def handle_live(request):
+    body, etag = _payloads(request.app)["html"]
+    return _conditional(request, body, etag, "text/html")
+
+
+async def handle_events_list(request):
+    body, etag = _payloads(request.app)["feed"]
+    return _conditional(request, body, etag, "application/json")
+
+
+async def handle_feed(request):
+    return web.Response(text=fixtures.h2h_feed(request.match_info["name"]), content_type="text/plain")
+
+
+def make_app(events: int = 100, latency: float = 0.0, error_rate: float = 0.0, seed: int = 1) -> web.Application:
+    app = web.Application(middlewares=[inject_faults])
+    app["events"] = events
+    app["latency"] = latency
+    app["error_rate"] = error_rate
+    app["rng"] = random.Random(seed)
+    app["version"] = 1
+    app["cached_n"] = None
+    app["stats"] = {"requests": 0, "errors": 0, "not_modified": 0, "bytes": 0}
+    app.router.add_get("/live/", handle_live)
+    app.router.add_get("/events/list", handle_events_list)
+    app.router.add_get("/x/feed/{name}", handle_feed)
+    return app
+
+
+async def start_standin(port: int = 0, **kwargs):
+    """Start the stand-in in the running loop; returns (runner, app, base_url)."""
+    app = make_app(**kwargs)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    sock = site._server.sockets[0]
+    base_url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    return runner, app, base_url
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local stand-in for PARI and Flashscore")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--events", type=int, default=100)
+    ap.add_argument("--latency", type=float, default=0.0, help="mean response delay, seconds")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    args = ap.parse_args()
+    web.run_app(make_app(args.events, args.latency, args.error_rate), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+# browser_pool.py - process-wide Playwright browser with a bounded page pool
+import asyncio
+import importlib.util
+import os
+import time
+import traceback
+from contextlib import asynccontextmanager
+
+# Playwright is imported on the first launch, not at startup (it is only needed for H2H fallbacks)
+PLAYWRIGHT_INSTALLED = importlib.util.find_spec("playwright") is not None
+
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+PAGE_MAX_USES = int(os.getenv("BROWSER_PAGE_MAX_USES", "25"))
+MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "450"))
+ACQUIRE_TIMEOUT = float(os.getenv("BROWSER_ACQUIRE_TIMEOUT", "60"))
+LAUNCH_ARGS = ["--no-sandbox", "--disable-dev-shm-usage"]
+CHROMIUM_COMMS = ("chrom", "headless_shell")  # /proc/<pid>/comm of the browser process
+
+
+def _children(pid: int):
+    kids = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                kids.extend(int(c) for c in f.read().split())
+    except OSError:
+        pass
+    return kids
+
+
+def _rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _comm(pid: int) -> str:
+    try:
+        with open(f"/proc/{pid}/comm") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def _descendants(root: int):
+    stack = [root]
+    seen = set()
+    while stack:
+        pid = stack.pop()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        yield pid
+        stack.extend(_children(pid))
+
+
+def process_tree_rss_mb() -> float:
+    """RSS of this process plus all descendants (Chromium runs as children). 0 if /proc is unavailable."""
+    return sum(_rss_kb(pid) for pid in _descendants(os.getpid())) / 1024.0
+
+
+def chromium_rss_mb() -> float:
+    """
+    RSS of the Chromium process trees alone: the bot itself and the Playwright driver are left out,
+    so a big event list in this process never looks like a leaking browser.
+    """
+    total = 0
+    stack = _children(os.getpid())
+    while stack:
+        pid = stack.pop()
+        if any(name in _comm(pid) for name in CHROMIUM_COMMS):
+            total += sum(_rss_kb(p) for p in _descendants(pid))
+        else:
+            stack.extend(_children(pid))
+    return total / 1024.0
+
+
+class _Slot:
+    __slots__ = ("context", "page", "uses", "generation")
+
+    def __init__(self, context, page, generation):
+        self.context = context
+        self.page = page
+        self.uses = 0
+        self.generation = generation
+
+
+class BrowserPool:
+    """
+    Lazily launched Chromium shared by every H2H lookup.
+    Pages live in their own contexts and are reused up to `max_uses` times,
+    the browser is relaunched when it crashes or Chromium's processes grow past `max_rss_mb`.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, max_uses: int = PAGE_MAX_USES, max_rss_mb: int = MAX_RSS_MB):
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self.max_rss_mb = max_rss_mb
+        self._pw = None
+        self._browser = None
+        self._generation = 0
+        self._idle = []
+        self._in_use = 0
+        self._waiting = 0
+        self._restart_pending = False
+        self._closed = False
+        self._sem = asyncio.Semaphore(self.size)
+        self._launch_lock = asyncio.Lock()
+        self.counters = {
+            "launches": 0,
+            "crashes": 0,
+            "acquires": 0,
+            "recycled_pages": 0,
+            "memory_restarts": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    @property
+    def available(self) -> bool:
+        return PLAYWRIGHT_INSTALLED and not self._closed
+
+    def _on_disconnected(self, *_):
+        if not self._closed:
+            print("⚠️ Chromium disconnected, will relaunch on next use")
+            self.counters["crashes"] += 1
+        self._browser = None
+
+    async def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            await self._teardown_browser()
+            if self._pw is None:
+                from playwright.async_api import async_playwright
+                self._pw = await async_playwright().start()
+            print("🚀 Launching Chromium (pool)...")
+            self._browser = await self._pw.chromium.launch(headless=True, args=LAUNCH_ARGS)
+            self._browser.on("disconnected", self._on_disconnected)
+            self._generation += 1
+            self.counters["launches"] += 1
+            return self._browser
+
+    async def _teardown_browser(self):
+        self._idle.clear()
+        browser, self._browser = self._browser, None
+        if browser is not None:
+            try:
+                browser.remove_listener("disconnected", self._on_disconnected)
+                await browser.close()
+            except Exception:
+                pass
+
+    async def _new_slot(self) -> _Slot:
+        browser = await self._ensure_browser()
+        context = await browser.new_context()
+        page = await context.new_page()
+        return _Slot(context, page, self._generation)
+
+    async def _discard(self, slot: _Slot):
+        try:
+            await slot.context.close()
+        except Exception:
+            pass
+
+    async def _take_slot(self) -> _Slot:
+        while self._idle:
+            slot = self._idle.pop()
+            if slot.generation == self._generation and self._browser is not None and not slot.page.is_closed():
+                return slot
+            await self._discard(slot)
+        return await self._new_slot()
+
+    @asynccontextmanager
+    async def page(self):
+        """Borrow a page: `async with pool.page() as page: ...`. A page that raised is not reused."""
+        if not self.available:
+            raise RuntimeError("Playwright is not available")
+        t0 = time.monotonic()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=ACQUIRE_TIMEOUT)
+        finally:
+            self._waiting -= 1
+        waited = time.monotonic() - t0
+        self.counters["acquires"] += 1
+        self.counters["wait_seconds_total"] += waited
+        self.counters["wait_seconds_max"] = max(self.counters["wait_seconds_max"], waited)
+
+        self._in_use += 1
+        slot = None
+        healthy = False
+        try:
+            slot = await self._take_slot()
+            slot.uses += 1
+            yield slot.page
+            healthy = True
+        finally:
+            self._in_use -= 1
+            try:
+                await self._release(slot, healthy)
+            finally:
+                self._sem.release()
+
+    async def _release(self, slot, healthy: bool):
+        if slot is None:
+            return
+        if self._closed or not healthy or slot.generation != self._generation:
+            await self._discard(slot)
+        elif slot.uses >= self.max_uses:
+            self.counters["recycled_pages"] += 1
+            await self._discard(slot)
+        else:
+            self._idle.append(slot)
+
+        if self.max_rss_mb and chromium_rss_mb() > self.max_rss_mb:
+            self._restart_pending = True
+        if self._restart_pending and self._in_use == 0:
+            self._restart_pending = False
+            self.counters["memory_restarts"] += 1
+            print(f"♻️ Browser RSS above {self.max_rss_mb} MB, restarting Chromium")
+            async with self._launch_lock:
+                await self._teardown_browser()
+
+    def stats(self) -> dict:
+        s = dict(self.counters)
+        s.update({
+            "pool_size": self.size,
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            "waiting": self._waiting,
+            "browser_running": self._browser is not None,
+        })
+        return s
+
+    async def close(self):
+        self._closed = True
+        async with self._launch_lock:
+            for slot in self._idle:
+                await self._discard(slot)
+            await self._teardown_browser()
+            if self._pw is not None:
+                try:
+                    await self._pw.stop()
+                except Exception:
+                    traceback.print_exc()
+                self._pw = None
+
+
+_pool = None
+
+
+def get_browser_pool() -> BrowserPool:
+    global _pool
+    if _pool is None:
+        _pool = BrowserPool()
+    return _pool
+
+
+async def shutdown_browser_pool():
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.close()
@@ -0,0 +1,43 @@
+# cycle_recorder.py - raw per-cycle snapshots (live HTML or feed JSON) for offline replay in backtest.py
+import gzip
+import json
+import os
+import time
+
+CYCLE_RECORD_DIR = os.getenv("CYCLE_RECORD_DIR", "")  # empty = recording off
+SUFFIXES = {"html": ".html.gz", "feed": ".json.gz"}
+
+
+def recording_enabled() -> bool:
+    return bool(CYCLE_RECORD_DIR)
+
+
+def record_cycle(source: str, payload, ts: float = None, directory: str = None) -> str:
+    """
+    Write one cycle's raw input as <dir>/<unix ms>.<source>.gz; `payload` is the
+    live page HTML for "html" and a feed snapshot dict for "feed". Returns the path.
+    """
+    directory = directory or CYCLE_RECORD_DIR
+    ts = time.time() if ts is None else ts
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{int(ts * 1000)}{SUFFIXES[source]}")
+    data = payload if source == "html" else json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    tmp = f"{path}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=5) as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+
+def iter_recorded(directory: str):
+    """(ts, source, payload) for every recorded cycle in `directory`, oldest first."""
+    entries = []
+    for name in os.listdir(directory):
+        for source, suffix in SUFFIXES.items():
+            stem = name[:-len(suffix)]
+            if name.endswith(suffix) and stem.isdigit():
+                entries.append((int(stem), source, name))
+    for ms, source, name in sorted(entries):
+        with gzip.open(os.path.join(directory, name), "rt", encoding="utf-8") as f:
+            text = f.read()
+        yield ms / 1000.0, source, text if source == "html" else json.loads(text)
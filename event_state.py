@@ -0,0 +1,100 @@
+# event_state.py - per-event state between fetch cycles (change detection + signal dedup)
+import os
+import time
+
+STATE_TTL = float(os.getenv("STATE_TTL", "1800"))  # drop events not seen for this long
+RESCORE_AFTER = float(os.getenv("RESCORE_AFTER", "900"))  # re-score unchanged events this often
+SIGNAL_DELTA = float(os.getenv("SIGNAL_DELTA", "0.05"))  # probability move that re-fires a signal
+
+
+class EventState:
+    __slots__ = ("odds", "score", "prob", "scored_at", "last_seen", "signal_prob")
+
+    def __init__(self):
+        self.odds = None
+        self.score = None
+        self.prob = None
+        self.scored_at = 0.0
+        self.last_seen = 0.0
+        self.signal_prob = None  # probability at the last signal, None while below threshold
+
+
+class EventStateStore:
+    def __init__(self, ttl: float = STATE_TTL, rescore_after: float = RESCORE_AFTER, signal_delta: float = SIGNAL_DELTA):
+        self.ttl = ttl
+        self.rescore_after = rescore_after
+        self.signal_delta = signal_delta
+        self._states = {}
+
+    def __len__(self):
+        return len(self._states)
+
+    @staticmethod
+    def assign_keys(events):
+        """
+        Give every event a stable `key`. Feed events use id + outcome; scraped
+        events use link/title plus their position among the block's in-band odds.
+        """
+        seen = {}
+        for ev in events:
+            if ev.get("id") is not None:
+                ev["key"] = f"{ev['id']}:{ev.get('outcome', '')}"
+                continue
+            base = f"{ev.get('link', '')}|{ev.get('teams', '')}"
+            n = seen.get(base, 0)
+            seen[base] = n + 1
+            ev["key"] = f"{base}#{n}"
+        return events
+
+    def get(self, ev):
+        return self._states.get(ev["key"])
+
+    def odds_moved(self, ev) -> bool:
+        st = self._states.get(ev["key"])
+        return st is not None and st.odds is not None and st.odds != ev.get("odds")
+
+    def needs_scoring(self, ev, now: float = None) -> bool:
+        """True for new events, changed odds/score, unscored or stale probabilities."""
+        now = time.time() if now is None else now
+        st = self._states.get(ev["key"])
+        if st is None:
+            st = self._states[ev["key"]] = EventState()
+        st.last_seen = now
+        return (st.prob is None
+                or st.odds != ev.get("odds")
+                or st.score != ev.get("score")
+                or now - st.scored_at >= self.rescore_after)
+
+    def record(self, ev, prob: float, threshold: float, final: bool = True, now: float = None) -> bool:
+        """
+        Store the probability for `ev`; returns True when a signal should be sent:
+        the event just crossed `threshold` or moved by at least `signal_delta` since the last signal.
+        A non-final (deadline fallback) score is not cached, so the event is re-scored next cycle,
+        and neither signals nor resets the signal state.
+        """
+        now = time.time() if now is None else now
+        st = self._states.get(ev["key"])
+        if st is None:
+            st = self._states[ev["key"]] = EventState()
+        st.last_seen = now
+        if not final:
+            return False
+        st.odds = ev.get("odds")
+        st.score = ev.get("score")
+        st.prob = prob
+        st.scored_at = now
+
+        if not prob or prob < threshold:
+            st.signal_prob = None
+            return False
+        if st.signal_prob is None or abs(prob - st.signal_prob) >= self.signal_delta:
+            st.signal_prob = prob
+            return True
+        return False
+
+    def evict(self, now: float = None) -> int:
+        now = time.time() if now is None else now
+        stale = [k for k, st in self._states.items() if now - st.last_seen > self.ttl]
+        for k in stale:
+            del self._states[k]
+        return len(stale)
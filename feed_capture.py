@@ -0,0 +1,70 @@
+# feed_capture.py - load a page with heavy resources blocked and capture one XHR feed response
+import os
+import time
+
+import metrics
+
+CAPTURE_TIMEOUT = float(os.getenv("CAPTURE_TIMEOUT", "15"))  # seconds to wait for the feed response
+CAPTURE_BLOCK_TYPES = frozenset(
+    x for x in os.getenv("CAPTURE_BLOCK_TYPES", "image,media,font,stylesheet,texttrack,eventsource,websocket,manifest").split(",") if x
+)
+CAPTURE_BLOCK_HOSTS = tuple(
+    x for x in os.getenv(
+        "CAPTURE_BLOCK_HOSTS",
+        "doubleclick.net,googlesyndication.com,googletagmanager.com,google-analytics.com,googletagservices.com,"
+        "adservice.google,amazon-adsystem.com,adnxs.com,criteo,facebook.net,hotjar,scorecardresearch.com,"
+        "quantserve.com,cookielaw.org,onetrust,taboola,outbrain,yandex.ru/metrika,mc.yandex",
+    ).split(",") if x
+)
+
+CAPTURE_BLOCKED = metrics.Counter("betfetcher_capture_blocked_requests_total", "Requests aborted while capturing a feed.", ("type",))
+CAPTURE_SECONDS = metrics.Histogram("betfetcher_capture_seconds", "Time from navigation to the captured feed response.", ("result",))
+
+
+def _blocked(request) -> str:
+    """Reason to abort `request` ("" to let it through)."""
+    if request.resource_type in CAPTURE_BLOCK_TYPES:
+        return request.resource_type
+    url = request.url
+    if any(host in url for host in CAPTURE_BLOCK_HOSTS):
+        return "tracker"
+    return ""
+
+
+async def _route_handler(route):
+    reason = _blocked(route.request)
+    if reason:
+        CAPTURE_BLOCKED.inc(type=reason)
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def capture_feed(page, url: str, marker: str, timeout: float = CAPTURE_TIMEOUT):
+    """
+    Navigate `page` to `url` and return the body (bytes) of the first successful
+    response whose URL contains `marker`, or None on timeout. Images, fonts, CSS
+    and ad/analytics hosts are aborted; the route is removed again before
+    returning, so the page can go back to a pool unchanged.
+    """
+    t0 = time.perf_counter()
+    await page.route("**/*", _route_handler)
+    result = "timeout"
+    try:
+        async with page.expect_response(lambda r: marker in r.url and r.ok, timeout=timeout * 1000) as info:
+            await page.goto(url, wait_until="commit", timeout=timeout * 1000)
+        response = await info.value
+        body = await response.body()
+        result = "ok"
+        return body
+    except Exception as e:
+        if type(e).__name__ != "TimeoutError":
+            result = "error"
+        print(f"⚠️ Feed {marker} not captured from {url}: {e}")
+        return None
+    finally:
+        CAPTURE_SECONDS.observe(time.perf_counter() - t0, result=result)
+        try:
+            await page.unroute("**/*", _route_handler)
+        except Exception:
+            pass
@@ -1,101 +1,187 @@
 # fetcher.py - PARI parser + analyzer
-import aiohttp
 import asyncio
-import re
+import os
+import zlib
 from notifier import Notifier
-from match_predictor import analyze_event
+from match_predictor import analyze_event, odds_only_probability, record_snapshots
+from odds_store import get_odds_series
+from pari_live import PariLivePage, get_live_page
+from pari_feed import fetch_feed_events, get_feed
+from cycle_recorder import record_cycle, recording_enabled
+from event_state import EventStateStore
+from scheduler import AdaptiveScheduler
+from h2h_prefetch import H2HPrefetcher, prefetch_enabled
+import metrics
 
-PARI_LIVE_URL = "https://pari.ru/live/"
+EVENT_SOURCE = os.getenv("EVENT_SOURCE", "html")  # html | feed
+SIGNAL_THRESHOLD = 0.7
+ANALYZE_CONCURRENCY = int(os.getenv("ANALYZE_CONCURRENCY", "8"))
+EVENT_DEADLINE = float(os.getenv("EVENT_DEADLINE", "20"))  # seconds per analyze_event
+CYCLE_DEADLINE = float(os.getenv("CYCLE_DEADLINE", "150"))  # seconds for the whole analysis stage
+SHARD_BY = os.getenv("SHARD_BY", "event")  # event | sport (WORKERS > 1, see shard_worker.py)
 
-async def fetch_live_html(session: aiohttp.ClientSession) -> str:
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-    async with session.get(PARI_LIVE_URL, headers=headers, timeout=20) as resp:
-        resp.raise_for_status()
-        return await resp.text()
+event_store = EventStateStore()
+last_cycle = {}  # summary of the most recent fetch_and_analyze run
 
-def extract_number(s: str):
-    try:
-        if not s:
-            return None
-        txt = re.sub(r'[^0-9,\\.]', '', s)
-        if not txt:
-            return None
-        return float(txt.replace(',', '.'))
-    except Exception:
-        return None
+def shard_of(ev, shards: int, by: str = None) -> int:
+    """Stable shard for an event: sport id modulo shards, or a CRC32 of the event id (link + title for scraped events)."""
+    by = by or SHARD_BY
+    if by == "sport" and ev.get("sport_id") is not None:
+        return int(ev["sport_id"]) % shards
+    ident = ev.get("id")
+    ident = str(ident) if ident is not None else f"{ev.get('link', '')}|{ev.get('teams', '')}"
+    return zlib.crc32(ident.encode("utf-8")) % shards
+
+def partition_events(events, shards: int, by: str = None):
+    """One list of events per shard (see shard_of)."""
+    parts = [[] for _ in range(shards)]
+    for ev in events:
+        parts[shard_of(ev, shards, by)].append(ev)
+    return parts
 
-from bs4 import BeautifulSoup
+def prioritize_events(events, store: EventStateStore = None):
+    """Events whose odds moved since the previous cycle first, then lowest odds first."""
+    store = event_store if store is None else store
+    return sorted(events, key=lambda ev: (not store.odds_moved(ev), ev["odds"]))
 
-async def parse_events_from_html(html: str):
-    soup = BeautifulSoup(html, "html.parser")
-    events = []
-    # Find event blocks by class name pattern used on pari.ru
-    for block in soup.find_all("div", class_=lambda c: c and "sport-base-event" in c):
+async def _score_event(ev, sem: asyncio.Semaphore, event_deadline: float, cycle_end: float):
+    loop = asyncio.get_running_loop()
+    async with sem:
+        budget = min(event_deadline, cycle_end - loop.time())
+        if budget <= 0:
+            return ev, odds_only_probability(ev["odds"]), False
         try:
-            # Teams/title detection
-            teams = None
-            sel = block.select_one(".sport-base-event__main__caption--JLR1n, .sport-sub-event__name--J7jv6, .table-component-text--Tjj3g, .team-names, .team-name")
-            if sel:
-                teams = sel.get_text(" ", strip=True)
-            if not teams:
-                teams = block.get_text(" ", strip=True)[:140]
+            with metrics.STAGE_SECONDS.time(stage="analyze"):
+                prob = await asyncio.wait_for(analyze_event(ev), timeout=budget)
+        except asyncio.TimeoutError:
+            return ev, odds_only_probability(ev["odds"]), False
+        except Exception:
+            prob = 0.0
+        return ev, prob, True
+
+async def analyze_events(events, concurrency: int = ANALYZE_CONCURRENCY,
+                         event_deadline: float = EVENT_DEADLINE, cycle_deadline: float = CYCLE_DEADLINE):
+    """
+    Score events with at most `concurrency` analyses in flight and yield (event, prob, final) as each finishes.
+    Slots are handed out in input order, so pass events already prioritized.
+    An event that misses its deadline (or never starts before the cycle deadline) gets the
+    odds-only estimate with final=False.
+    """
+    loop = asyncio.get_running_loop()
+    cycle_end = loop.time() + cycle_deadline
+    sem = asyncio.Semaphore(max(1, concurrency))
+    tasks = [asyncio.create_task(_score_event(ev, sem, event_deadline, cycle_end)) for ev in events]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        for t in tasks:
+            t.cancel()
 
-            # collect numeric-like spans
-            odds = []
-            for span in block.find_all(["span","div"]):
-                txt = span.get_text(strip=True)
-                num = extract_number(txt)
-                if num:
-                    odds.append(num)
-            odds = sorted(set(odds))
+async def _record(source: str, payload):
+    try:
+        await asyncio.to_thread(record_cycle, source, payload)
+    except Exception as e:
+        print(f"⚠️ Cycle not recorded: {e}")
 
-            # create events for odds in target range
-            for o in odds:
-                if 1.05 <= o <= 1.33:
-                    link_el = block.select_one("a[href]")
-                    link = link_el["href"] if link_el and link_el.get("href") else PARI_LIVE_URL
-                    if link.startswith("/"):
-                        link = "https://pari.ru" + link
-                    events.append({
-                        "teams": teams,
-                        "odds": o,
-                        "link": link
-                    })
-        except Exception:
-            continue
+async def collect_events(source: str = None, live_page: PariLivePage = None):
+    """Candidate events from the configured source: scraped live page or JSON feed."""
+    source = source or EVENT_SOURCE
+    if source == "feed":
+        with metrics.STAGE_SECONDS.time(stage="fetch"):
+            events = await fetch_feed_events()
+        if recording_enabled():
+            await _record("feed", get_feed().snapshot())
+        return events
+    live_page = live_page or get_live_page()
+    live_page.keep_html = recording_enabled()
+    # the page is parsed while it downloads, so "fetch" covers both; a 304 skips parsing
+    with metrics.STAGE_SECONDS.time(stage="fetch"):
+        events = await live_page.fetch()
+    if live_page.html is not None:
+        await _record("html", live_page.html)
     return events
 
-async def fetch_and_analyze(notifier: Notifier):
-    async with aiohttp.ClientSession() as session:
-        html = await fetch_live_html(session)
-        events = await parse_events_from_html(html)
-        results = []
-        for ev in events:
-            try:
-                prob = await analyze_event(ev)
-            except Exception:
-                prob = 0.0
-            if prob and prob >= 0.7:
-                text = (f"[SIGNAL]\\nEvent: {ev['teams']}\\nOdds: {ev['odds']}\\nProbability: {int(prob*100)}%\\nLink: {ev['link']}")
-                await notifier.notify(text)
-                results.append({"event": ev, "prob": prob})
-        return results
+def near_band_count(source: str = None, live_page: PariLivePage = None) -> int:
+    """Outcomes priced just outside the odds band at the last fetch; the scheduler polls faster while there are any."""
+    source = source or EVENT_SOURCE
+    if source == "feed":
+        return get_feed().near_band()
+    return (live_page or get_live_page()).near_band
+
+async def fetch_and_analyze(notifier: Notifier, store: EventStateStore = None, live_page: PariLivePage = None):
+    """Collect events from the source and run analyze_cycle over them."""
+    return await analyze_cycle(notifier, await collect_events(live_page=live_page), store)
 
-async def fetcher_loop(notifier: Notifier, update_interval: int = 180):
+async def analyze_cycle(notifier: Notifier, events, store: EventStateStore = None):
+    """Score only new or changed events and signal on threshold crossings (see EventStateStore.record)."""
+    store = event_store if store is None else store
+    events = store.assign_keys(events)
+    record_snapshots(events)
+    pending = [ev for ev in events if store.needs_scoring(ev)]
+    moved = sum(1 for ev in pending if store.odds_moved(ev))
+    metrics.EVENTS.inc(len(events))
+    metrics.LAST_CYCLE_EVENTS.set(len(events))
+    results = []
+    async for ev, prob, final in analyze_events(prioritize_events(pending, store)):
+        metrics.EVENTS_SCORED.inc(result="final" if final else "deadline")
+        if store.record(ev, prob, SIGNAL_THRESHOLD, final=final):
+            text = (f"[SIGNAL]\\nEvent: {ev['teams']}\\nOdds: {ev['odds']}\\nProbability: {int(prob*100)}%\\nLink: {ev['link']}")
+            await notifier.notify(text)
+            metrics.SIGNALS.inc()
+            results.append({"event": ev, "prob": prob})
+    evicted = store.evict()
+    await get_odds_series().maintain()
+    last_cycle.update(events=len(events), scored=len(pending), moved=moved, signals=len(results), tracked=len(store))
+    print(f"📊 events={len(events)} scored={len(pending)} moved={moved} tracked={len(store)} evicted={evicted}")
+    return results
+
+async def fetcher_loop(notifier: Notifier, update_interval: int = 180, on_cycle=None):
+    """Poll forever; `on_cycle(summary)` is called after every successful cycle."""
+    scheduler = AdaptiveScheduler.for_source(EVENT_SOURCE, update_interval)
+    live_page = PariLivePage()  # one keep-alive session for the lifetime of the loop
+    prefetch_task = None
+    if prefetch_enabled():
+        prefetch_task = asyncio.create_task(H2HPrefetcher(poll=EVENT_SOURCE != "feed").run())
+    try:
+        await _fetch_forever(notifier, scheduler, live_page, on_cycle)
+    finally:
+        if prefetch_task is not None:
+            prefetch_task.cancel()
+        await live_page.close()
+
+async def _fetch_forever(notifier: Notifier, scheduler: AdaptiveScheduler, live_page: PariLivePage, on_cycle=None):
     backoff = 5
     while True:
         try:
-            print("🔄 Fetching PARI.live...")
-            signals = await fetch_and_analyze(notifier)
+            scheduler.anchor()
+            print(f"🔄 Fetching PARI.live ({EVENT_SOURCE})...")
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            try:
+                signals = await fetch_and_analyze(notifier, live_page=live_page)
+            except Exception:
+                metrics.CYCLES.inc(status="error")
+                raise
+            elapsed = loop.time() - started
+            metrics.CYCLE_SECONDS.observe(elapsed)
+            metrics.CYCLES.inc(status="ok")
+            metrics.mark_cycle_success()
+            if elapsed > scheduler.interval:
+                metrics.CYCLE_OVERRUNS.inc()
             if not signals:
                 print("No matching signals found.")
+            if on_cycle is not None:
+                on_cycle(dict(last_cycle, seconds=elapsed))
             backoff = 5
-            await asyncio.sleep(update_interval)
+            scheduler.observe(last_cycle.get("events", 0), last_cycle.get("moved", 0), near_band_count(live_page=live_page))
+            await scheduler.wait_next()
         except Exception as e:
             print("Fetcher loop error:", e)
             try:
                 await notifier.notify(f"⚠️ Fetcher error: {e}")
             except Exception:
                 pass
+            scheduler.reset()
             await asyncio.sleep(backoff)
             backoff = min(backoff*2, 300)
@@ -0,0 +1,178 @@
+# flashscore_feed.py - streaming decoder for Flashscore "¬÷" feeds (h2h_*, df_*, ...)
+#
+# A feed is a run of records separated by "~"; each record is a run of
+# "KEY÷VALUE¬" fields. Section header records (KA) are followed by the match
+# records of that section (KP...). Nothing is split up front: the decoder walks
+# the buffer with str.find / bytes.find and yields one record at a time.
+
+RECORD_SEP = "~"
+FIELD_SEP = "¬"
+VALUE_SEP = "÷"
+
+# h2h feed fields
+F_SECTION = "KA"      # section header, e.g. "Head-to-head matches", "Last matches: X"
+F_MATCH_ID = "KP"
+F_TIMESTAMP = "KC"    # kickoff, unix seconds
+F_TOURNAMENT = "KF"
+F_HOME_ID = "JA"
+F_HOME = "KJ"
+F_AWAY_ID = "JB"
+F_AWAY = "KK"
+F_SCORE = "KL"        # "2:1"
+F_WINNER = "KS"       # "1" home, "2" away, "0" draw
+
+H2H_SECTION_MARK = "head-to-head"
+
+
+class H2HMatch:
+    __slots__ = ("section", "match_id", "timestamp", "tournament", "home_id", "home",
+                 "away_id", "away", "home_score", "away_score", "winner")
+
+    def __init__(self, section, fields):
+        self.section = section
+        self.match_id = fields.get(F_MATCH_ID)
+        ts = fields.get(F_TIMESTAMP)
+        self.timestamp = int(ts) if ts and ts.isdigit() else None
+        self.tournament = fields.get(F_TOURNAMENT)
+        self.home_id = fields.get(F_HOME_ID)
+        self.home = fields.get(F_HOME)
+        self.away_id = fields.get(F_AWAY_ID)
+        self.away = fields.get(F_AWAY)
+        self.home_score, self.away_score = _parse_score(fields.get(F_SCORE))
+        self.winner = _winner(fields.get(F_WINNER), self.home_score, self.away_score)
+
+    @property
+    def score(self):
+        if self.home_score is None or self.away_score is None:
+            return None
+        return f"{self.home_score}:{self.away_score}"
+
+    @property
+    def winner_name(self):
+        return {1: self.home, 2: self.away, 0: "Draw"}.get(self.winner)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"H2HMatch({self.home} {self.score} {self.away}, {self.tournament}, ts={self.timestamp})"
+
+
+def _parse_score(raw):
+    if not raw:
+        return None, None
+    home, sep, away = raw.partition(":")
+    if not sep or not home.strip().isdigit() or not away.strip().isdigit():
+        return None, None
+    return int(home), int(away)
+
+
+def _winner(raw, home_score, away_score):
+    if raw in ("1", "2", "0"):
+        return int(raw)
+    if home_score is None or away_score is None:
+        return None
+    return 1 if home_score > away_score else 2 if away_score > home_score else 0
+
+
+def _iter_fields_str(buf: str, start: int, end: int):
+    pos = start
+    while pos < end:
+        stop = buf.find(FIELD_SEP, pos, end)
+        if stop < 0:
+            stop = end
+        mid = buf.find(VALUE_SEP, pos, stop)
+        if mid >= 0:
+            yield buf[pos:mid], buf[mid + 1:stop]
+        pos = stop + 1
+
+
+_B_RECORD = RECORD_SEP.encode("utf-8")
+_B_FIELD = FIELD_SEP.encode("utf-8")
+_B_VALUE = VALUE_SEP.encode("utf-8")
+
+
+def _iter_fields_bytes(buf: bytes, start: int, end: int):
+    pos = start
+    while pos < end:
+        stop = buf.find(_B_FIELD, pos, end)
+        if stop < 0:
+            stop = end
+        mid = buf.find(_B_VALUE, pos, stop)
+        if mid >= 0:
+            yield buf[pos:mid].decode("utf-8"), buf[mid + len(_B_VALUE):stop].decode("utf-8", "replace")
+        pos = stop + len(_B_FIELD)
+
+
+def iter_records(feed):
+    """Yield one {key: value} dict per "~"-separated record of a str or bytes feed."""
+    if isinstance(feed, (bytes, bytearray, memoryview)):
+        feed = bytes(feed)
+        rec_sep, fields = _B_RECORD, _iter_fields_bytes
+    else:
+        rec_sep, fields = RECORD_SEP, _iter_fields_str
+    pos = 0
+    end = len(feed)
+    while pos < end:
+        stop = feed.find(rec_sep, pos)
+        if stop < 0:
+            stop = end
+        if stop > pos:
+            record = dict(fields(feed, pos, stop))
+            if record:
+                yield record
+        pos = stop + len(rec_sep)
+
+
+def iter_records_chunked(chunks):
+    """Like iter_records, for an iterable of str/bytes chunks (e.g. a streamed HTTP body)."""
+    tail = None
+    for chunk in chunks:
+        buf = chunk if tail is None else tail + chunk
+        sep = _B_RECORD if isinstance(buf, (bytes, bytearray)) else RECORD_SEP
+        cut = buf.rfind(sep)
+        if cut < 0:
+            tail = buf
+            continue
+        yield from iter_records(buf[:cut])
+        tail = buf[cut + len(sep):]
+    if tail:
+        yield from iter_records(tail)
+
+
+def iter_h2h_matches(records, section: str = None):
+    """
+    Turn decoded records into H2HMatch objects. `section` keeps only sections whose
+    header contains that text (case-insensitive), e.g. H2H_SECTION_MARK.
+    """
+    current = None
+    wanted = section.lower() if section else None
+    for record in records:
+        if F_SECTION in record:
+            current = record[F_SECTION]
+            continue
+        if F_MATCH_ID not in record:
+            continue
+        if wanted and (current is None or wanted not in current.lower()):
+            continue
+        yield H2HMatch(current, record)
+
+
+def parse_h2h(feed, limit: int = None, section: str = None):
+    """List of H2HMatch from a str or bytes h2h feed (at most `limit`)."""
+    out = []
+    for match in iter_h2h_matches(iter_records(feed), section):
+        out.append(match)
+        if limit is not None and len(out) >= limit:
+            break
+    return out
+
+
+def has_sections(feed) -> bool:
+    """True if the feed contains any section header (KA) record."""
+    return any(F_SECTION in record for record in iter_records(feed))
+
+
+def is_feed(text) -> bool:
+    sep = _B_FIELD if isinstance(text, (bytes, bytearray)) else FIELD_SEP
+    return sep in text
@@ -0,0 +1,222 @@
+# h2h_cache.py - bounded LRU+TTL cache for H2H lookups with single-flight and optional sqlite persistence
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+H2H_TTL = float(os.getenv("H2H_TTL", "3600"))  # fresh for this long
+H2H_NEGATIVE_TTL = float(os.getenv("H2H_NEGATIVE_TTL", "600"))  # failed/empty lookups
+H2H_STALE_TTL = float(os.getenv("H2H_STALE_TTL", "21600"))  # served stale (and refreshed) for this long after expiry
+H2H_CACHE_MAX_ENTRIES = int(os.getenv("H2H_CACHE_MAX_ENTRIES", "5000"))
+H2H_CACHE_MAX_BYTES = int(os.getenv("H2H_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+H2H_CACHE_DB = os.getenv("H2H_CACHE_DB", "")  # path to a sqlite file; empty = memory only
+
+
+class _Entry:
+    __slots__ = ("data", "stored_at", "ttl", "negative", "size", "retry_at")
+
+    def __init__(self, data, stored_at, ttl, negative, size):
+        self.data = data
+        self.stored_at = stored_at
+        self.ttl = ttl
+        self.negative = negative
+        self.size = size
+        self.retry_at = 0.0  # no background refresh before this (set after a failed refresh)
+
+
+class _SqliteStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS h2h ("
+            " key TEXT PRIMARY KEY, stored_at REAL, ttl REAL, negative INTEGER, data TEXT)"
+        )
+
+    def load(self, now: float, stale_ttl: float, limit: int):
+        self._conn.execute("DELETE FROM h2h WHERE stored_at + ttl + ? < ?", (stale_ttl, now))
+        return self._conn.execute(
+            "SELECT key, stored_at, ttl, negative, data FROM h2h ORDER BY stored_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+
+    def get(self, key: str):
+        return self._conn.execute(
+            "SELECT stored_at, ttl, negative, data FROM h2h WHERE key = ?", (key,)
+        ).fetchone()
+
+    def put(self, key: str, stored_at: float, ttl: float, negative: bool, data: str):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO h2h (key, stored_at, ttl, negative, data) VALUES (?, ?, ?, ?, ?)",
+            (key, stored_at, ttl, int(negative), data),
+        )
+
+    def close(self):
+        self._conn.close()
+
+
+class H2HCache:
+    """
+    LRU cache with per-entry TTL, bounded by entry count and approximate payload bytes.
+    - concurrent misses for one key share a single fetch
+    - empty results and errors are cached for `negative_ttl`
+    - expired entries are returned for `stale_ttl` while a background refresh runs;
+      a failed or empty refresh keeps the entry and is retried after `negative_ttl`;
+      past the stale window a failed refresh is cached as a negative entry
+    - with `db_path`, entries are written through to sqlite and loaded on start
+    """
+
+    def __init__(self, ttl: float = H2H_TTL, negative_ttl: float = H2H_NEGATIVE_TTL,
+                 stale_ttl: float = H2H_STALE_TTL, max_entries: int = H2H_CACHE_MAX_ENTRIES,
+                 max_bytes: int = H2H_CACHE_MAX_BYTES, db_path: str = H2H_CACHE_DB):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._inflight = {}
+        self._store = None
+        self.counters = {
+            "hits": 0,
+            "negative_hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "refreshes": 0,
+            "errors": 0,
+            "refresh_failures": 0,
+            "disk_hits": 0,
+        }
+        if db_path:
+            try:
+                self._store = _SqliteStore(db_path)
+                self._warm()
+            except Exception as e:
+                print(f"⚠️ H2H cache sqlite disabled: {e}")
+                self._store = None
+
+    def _warm(self):
+        rows = self._store.load(time.time(), self.stale_ttl, self.max_entries)
+        for key, stored_at, ttl, negative, data in reversed(rows):
+            self._put_memory(key, json.loads(data), stored_at, ttl, bool(negative), len(data))
+        if rows:
+            print(f"🔥 H2H cache warmed with {len(rows)} entries from {self._store.path}")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _put_memory(self, key, data, stored_at, ttl, negative, size):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+        self._entries[key] = _Entry(data, stored_at, ttl, negative, size)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.counters["evictions"] += 1
+
+    async def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None and self._store is not None:
+            try:
+                row = await asyncio.to_thread(self._store.get, key)
+            except Exception as e:
+                print(f"⚠️ H2H cache read failed: {e}")
+                row = None
+            entry = self._entries.get(key)  # another lookup may have loaded it meanwhile
+            if entry is None and row is not None:
+                stored_at, ttl, negative, data = row
+                self.counters["disk_hits"] += 1
+                self._put_memory(key, json.loads(data), stored_at, ttl, bool(negative), len(data))
+                entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    async def _store_result(self, key, data, negative):
+        now = time.time()
+        ttl = self.negative_ttl if negative else self.ttl
+        payload = json.dumps(data, ensure_ascii=False)
+        self._put_memory(key, data, now, ttl, negative, len(payload))
+        if self._store is not None:
+            try:
+                await asyncio.to_thread(self._store.put, key, now, ttl, negative, payload)
+            except Exception as e:
+                print(f"⚠️ H2H cache write failed: {e}")
+
+    async def _fetch(self, key, fetch):
+        try:
+            data = await fetch()
+            negative = not data
+        except Exception as e:
+            self.counters["errors"] += 1
+            print(f"⚠️ H2H fetch failed for {key}: {e}")
+            data, negative = None, True
+        if negative:
+            current = self._entries.get(key)
+            now = time.time()
+            if current is not None and not current.negative and now < current.stored_at + current.ttl + self.stale_ttl:
+                # a refresh of a good entry failed: keep serving it while it is in the stale window, retry later
+                self.counters["refresh_failures"] += 1
+                current.retry_at = now + self.negative_ttl
+                return current.data
+        await self._store_result(key, data, negative)
+        return data
+
+    def _start_fetch(self, key, fetch):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            return task, False
+        return task, True
+
+    async def get(self, key: str, fetch):
+        """Return cached data for `key`, calling `fetch()` (a coroutine function) on a miss."""
+        now = time.time()
+        entry = await self._lookup(key)
+        if entry is not None:
+            age = now - entry.stored_at
+            if age < entry.ttl:
+                self.counters["negative_hits" if entry.negative else "hits"] += 1
+                return entry.data
+            if not entry.negative and age < entry.ttl + self.stale_ttl:
+                self.counters["stale_hits"] += 1
+                if now >= entry.retry_at:
+                    _, running = self._start_fetch(key, fetch)
+                    if not running:
+                        self.counters["refreshes"] += 1
+                return entry.data
+            if now < entry.retry_at:
+                # past the stale window with a refresh failing: do not refetch before retry_at
+                self.counters["negative_hits"] += 1
+                return None
+
+        task, running = self._start_fetch(key, fetch)
+        self.counters["coalesced" if running else "misses"] += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        s = dict(self.counters)
+        lookups = s["hits"] + s["negative_hits"] + s["stale_hits"] + s["misses"] + s["coalesced"]
+        s.update({
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "inflight": len(self._inflight),
+            "hit_ratio": (s["hits"] + s["negative_hits"] + s["stale_hits"]) / lookups if lookups else 0.0,
+            "persistent": self._store is not None,
+        })
+        return s
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
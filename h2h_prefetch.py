@@ -0,0 +1,139 @@
+# h2h_prefetch.py - warm the H2H cache for pre-match events before they go live
+#
+# Every PREFETCH_INTERVAL seconds the upcoming line is read from the events/list
+# feed (pari_feed), ranked by kickoff time and by how likely the favourite's price
+# is to enter the odds band, and looked up through a token bucket. A prefetch
+# waits while live lookups are in flight, so it never competes with the cycle.
+import asyncio
+import os
+import time
+
+import metrics
+from h2h_cache import H2H_TTL
+from match_predictor import fetch_h2h_cached, live_lookups_inflight
+from notifier import TokenBucket
+from pari_feed import get_feed
+from pari_parser import ODDS_MAX, ODDS_MIN
+
+H2H_PREFETCH = os.getenv("H2H_PREFETCH", "1")  # "0" disables the prefetcher
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "300"))  # seconds between re-reads of the line
+PREFETCH_HORIZON = float(os.getenv("PREFETCH_HORIZON", str(6 * 3600)))  # kickoffs this far ahead
+PREFETCH_RATE = float(os.getenv("PREFETCH_RATE", "0.5"))  # lookups per second
+PREFETCH_BURST = int(os.getenv("PREFETCH_BURST", "2"))
+PREFETCH_YIELD = float(os.getenv("PREFETCH_YIELD", "0.5"))  # re-check delay while live lookups run
+PREFETCH_ODDS_CEILING = float(os.getenv("PREFETCH_ODDS_CEILING", "1.8"))  # favourites above this are skipped
+
+PREFETCHED = metrics.Counter("betfetcher_h2h_prefetch_total", "Pre-match H2H lookups by result.", ("result",))
+PREFETCH_QUEUE = metrics.Gauge("betfetcher_h2h_prefetch_queue", "Pre-match pairs waiting to be looked up.")
+
+
+def band_likelihood(odds: dict) -> float:
+    """
+    Rough chance that an event is priced inside the odds band once live: 1 when the
+    favourite already is, falling linearly to 0 at PREFETCH_ODDS_CEILING.
+    """
+    if not odds:
+        return 0.3
+    fav = min(odds.values())
+    if fav < ODDS_MIN:
+        return 0.5
+    if fav <= ODDS_MAX:
+        return 1.0
+    if fav >= PREFETCH_ODDS_CEILING:
+        return 0.0
+    return 1.0 - (fav - ODDS_MAX) / (PREFETCH_ODDS_CEILING - ODDS_MAX)
+
+
+def prefetch_priority(ev: dict, now: float) -> float:
+    hours = max(0.0, ev["start_time"] - now) / 3600
+    return band_likelihood(ev["odds"]) / (1.0 + hours)
+
+
+class H2HPrefetcher:
+    def __init__(self, feed=None, poll: bool = True, source=None, interval: float = PREFETCH_INTERVAL,
+                 horizon: float = PREFETCH_HORIZON, rate: float = PREFETCH_RATE, burst: int = PREFETCH_BURST,
+                 yield_delay: float = PREFETCH_YIELD, ttl: float = H2H_TTL):
+        self.feed = feed or get_feed()
+        self.poll = poll  # False when the pipeline already polls the same feed (EVENT_SOURCE=feed)
+        self.source = source  # callable -> upcoming events; replaces the feed (shard workers)
+        self.interval = interval
+        self.horizon = horizon
+        self.bucket = TokenBucket(rate, burst)
+        self.yield_delay = yield_delay
+        self.ttl = ttl
+        self._warmed = {}  # (team1, team2) -> monotonic time of the last prefetch
+        self.stats = {"rounds": 0, "queued": 0, "found": 0, "missing": 0, "errors": 0,
+                      "recent": 0, "yielded": 0}
+
+    def plan(self, upcoming, now: float = None):
+        """Pairs to look up, best first; pairs prefetched within `ttl` and unlikely events are left out."""
+        now = time.time() if now is None else now
+        mono = time.monotonic()
+        self._warmed = {pair: t for pair, t in self._warmed.items() if mono - t < self.ttl}
+        ranked = []
+        for ev in upcoming:
+            if (ev["team1"], ev["team2"]) in self._warmed:
+                self.stats["recent"] += 1
+                continue
+            priority = prefetch_priority(ev, now)
+            if priority > 0:
+                ranked.append((priority, ev))
+        ranked.sort(key=lambda item: (-item[0], item[1]["start_time"]))
+        return [ev for _, ev in ranked]
+
+    async def _upcoming(self):
+        if self.source is not None:
+            return self.source()
+        if self.poll or self.feed.version is None:
+            await self.feed.poll()
+        return self.feed.upcoming(self.horizon)
+
+    async def _idle(self):
+        """Wait until no live lookup is in flight."""
+        while live_lookups_inflight():
+            self.stats["yielded"] += 1
+            await asyncio.sleep(self.yield_delay)
+
+    async def prefetch(self, ev: dict):
+        await self._idle()
+        await self.bucket.acquire()
+        await self._idle()  # a live lookup may have started while waiting for a token
+        pair = (ev["team1"], ev["team2"])
+        try:
+            summary = await fetch_h2h_cached(*pair, prefetch=True)
+        except Exception as e:
+            self.stats["errors"] += 1
+            PREFETCHED.inc(result="error")
+            print(f"⚠️ H2H prefetch failed for {pair[0]} — {pair[1]}: {e}")
+            return
+        result = "found" if summary else "missing"
+        self.stats[result] += 1
+        PREFETCHED.inc(result=result)
+        self._warmed[pair] = time.monotonic()
+
+    async def run_once(self, deadline: float = None):
+        """One round: read the line and work through the queue until `deadline` (monotonic)."""
+        self.stats["rounds"] += 1
+        queue = self.plan(await self._upcoming())
+        self.stats["queued"] += len(queue)
+        for i, ev in enumerate(queue):
+            PREFETCH_QUEUE.set(len(queue) - i)
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            await self.prefetch(ev)
+        PREFETCH_QUEUE.set(0)
+
+    async def run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.run_once(deadline=started + self.interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ H2H prefetch round failed: {e}")
+            await asyncio.sleep(max(0.0, started + self.interval - time.monotonic()))
+
+
+def prefetch_enabled() -> bool:
+    return H2H_PREFETCH == "1"
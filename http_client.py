@@ -0,0 +1,156 @@
+# http_client.py - shared non-blocking HTTP client with keep-alive pooling
+import asyncio
+import os
+
+import aiohttp
+
+try:
+    import brotli  # noqa: F401  (aiohttp decodes br responses when it is installed)
+    ACCEPT_ENCODING = "br, gzip, deflate"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "32"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "6"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", "30"))
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+
+
+def new_http_session(timeout: float = HTTP_TIMEOUT, trace_configs=None) -> aiohttp.ClientSession:
+    """Keep-alive session with DNS caching and compression hints; the caller owns (and closes) it."""
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_MAX_CONNECTIONS,
+        limit_per_host=HTTP_MAX_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE,
+        ttl_dns_cache=300,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=timeout, sock_connect=HTTP_CONNECT_TIMEOUT),
+        headers=DEFAULT_HEADERS,
+        trace_configs=trace_configs,
+    )
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Process-wide session, created on first use inside the running loop."""
+    global _session
+    if _session is None or _session.closed:
+        _session = new_http_session()
+    return _session
+
+
+def timing_trace_config(observe) -> aiohttp.TraceConfig:
+    """
+    TraceConfig calling observe(phase, seconds) for "dns", "connect" (TCP plus the
+    TLS handshake, which aiohttp reports as one step) and "ttfb" (request start to
+    response headers, so it includes dns/connect on a fresh connection), and observe("reused", 0) when a pooled connection is reused.
+    """
+    loop_time = lambda: asyncio.get_running_loop().time()
+
+    async def on_request_start(session, ctx, params):
+        ctx.started = loop_time()
+
+    async def on_dns_start(session, ctx, params):
+        ctx.dns_started = loop_time()
+
+    async def on_dns_end(session, ctx, params):
+        observe("dns", loop_time() - ctx.dns_started)
+
+    async def on_connect_start(session, ctx, params):
+        ctx.connect_started = loop_time()
+
+    async def on_connect_end(session, ctx, params):
+        observe("connect", loop_time() - ctx.connect_started)
+
+    async def on_reuse(session, ctx, params):
+        observe("reused", 0.0)
+
+    async def on_request_end(session, ctx, params):
+        observe("ttfb", loop_time() - ctx.started)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_dns_resolvehost_start.append(on_dns_start)
+    trace.on_dns_resolvehost_end.append(on_dns_end)
+    trace.on_connection_create_start.append(on_connect_start)
+    trace.on_connection_create_end.append(on_connect_end)
+    trace.on_connection_reuseconn.append(on_reuse)
+    trace.on_request_end.append(on_request_end)
+    return trace
+
+
+async def close_http_session():
+    global _session
+    session, _session = _session, None
+    if session is not None and not session.closed:
+        await session.close()
+
+
+async def _get(url: str, reader, headers: dict = None, params: dict = None, timeout: float = None, retries: int = None):
+    """
+    GET `url` and return reader(resp). Connection errors, timeouts and
+    RETRY_STATUSES are retried with exponential backoff; the last status/error wins.
+    """
+    retries = HTTP_RETRIES if retries is None else retries
+    kwargs = {"headers": headers, "params": params}
+    if timeout:
+        kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout, sock_connect=HTTP_CONNECT_TIMEOUT)
+    delay = 0.5
+    for attempt in range(retries + 1):
+        try:
+            async with get_http_session().get(url, **kwargs) as resp:
+                if not (resp.status in RETRY_STATUSES and attempt < retries):
+                    return await reader(resp)
+                retry_after = resp.headers.get("Retry-After", "")
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt >= retries:
+                raise
+            retry_after = ""
+        # back off outside the `async with`, so the pooled connection is released first
+        await asyncio.sleep(min(float(retry_after), 30) if retry_after.isdigit() else delay)
+        delay *= 2
+
+
+async def _read_text(resp):
+    return resp.status, await resp.text()
+
+
+async def _read_conditional(resp):
+    validators = {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+    }
+    if resp.status == 304:
+        return 304, None, validators
+    return resp.status, await resp.read(), validators
+
+
+async def fetch_text(url: str, headers: dict = None, timeout: float = None, retries: int = None):
+    """GET `url` and return (status, text)."""
+    return await _get(url, _read_text, headers=headers, timeout=timeout, retries=retries)
+
+
+async def fetch_conditional(url: str, etag: str = None, last_modified: str = None, params: dict = None,
+                            timeout: float = None, retries: int = None):
+    """
+    Conditional GET. Returns (status, body_bytes, validators); body is None on 304.
+    Pass the returned validators back on the next call.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return await _get(url, _read_conditional, headers=headers, params=params, timeout=timeout, retries=retries)
@@ -1,6 +1,8 @@
 import aiohttp
 import asyncio
 
+from pari_feed import build_live_events
+
 URL = "https://line-lb01-w.pb06e2-resources.com/events/list?lang=ru&scopeMarket=2300"
 
 async def fetch_data():
@@ -13,25 +15,12 @@ async def main():
     all_events = data.get("events", [])
     live_infos = data.get("liveEventInfos", [])
 
-    # Индексируем события по ID для быстрого доступа
-    events_map = {e["id"]: e for e in all_events}
-
-    live_events = []
-    for info in live_infos:
-        event_id = info.get("eventId")
-        base = events_map.get(event_id)
-        if base:
-            sport_id = base.get("sportId")
-            team1 = base.get("team1")
-            team2 = base.get("team2")
-            live_events.append({
-                "id": event_id,
-                "sportId": sport_id,
-                "team1": team1,
-                "team2": team2,
-                "timer": info.get("timer"),
-                "score": info.get("scoreComment"),
-            })
+    # Склеиваем события и live-информацию по ID (та же логика, что и в pari_feed)
+    live_events = [
+        {"id": ev.id, "sportId": ev.sport_id, "team1": ev.team1, "team2": ev.team2,
+         "timer": ev.timer, "score": ev.score}
+        for ev in build_live_events(all_events, live_infos, data.get("customFactors", []))
+    ]
 
     print(f"📺 Найдено live событий: {len(live_events)}")
     for ev in live_events[:10]:  # покажем первые 10
@@ -1,13 +1,23 @@
 # main.py - entrypoint for Render
+#
+# Startup binds the HTTP port first (aiohttp.web + metrics only), then imports the
+# pipeline and telegram in a worker thread, starts the bot and warms shared clients
+# in the background. /livez answers as soon as the port is bound, /readyz once the
+# first fetch cycle has finished. With WEBHOOK_URL set, Telegram delivers updates
+# to WEBHOOK_PATH on the same server instead of being long-polled.
+import time
+STARTUP_T0 = time.perf_counter()
+
 import os
 import asyncio
+import hashlib
+import hmac
+import importlib
 import signal
 import datetime
 import traceback
 from aiohttp import web
-from telegram.ext import Application, CommandHandler, ContextTypes
-from notifier import Notifier
-from fetcher import fetcher_loop
+import metrics
 
 def get_env(name: str, required: bool = True, default=None):
     v = os.getenv(name, default)
@@ -20,25 +30,153 @@ ADMIN_CHAT_ID = int(get_env("ADMIN_CHAT_ID"))
 UPDATE_INTERVAL = int(os.getenv("UPDATE_INTERVAL", "180"))
 HTTP_PORT = int(os.getenv("PORT", "10000"))
 ENABLE_POLLING = os.getenv("ENABLE_POLLING", "0")  # set to "1" to enable polling (not recommended on Render)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")  # public base URL, e.g. https://betfetcher.onrender.com; takes precedence over polling
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+# sent back by Telegram in X-Telegram-Bot-Api-Secret-Token; derived from the token so all instances agree
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or hashlib.sha256(BOT_TOKEN.strip().encode()).hexdigest()
+HEALTH_MAX_CYCLE_AGE = int(os.getenv("HEALTH_MAX_CYCLE_AGE", str(UPDATE_INTERVAL * 3 + 120)))
+WORKERS = int(os.getenv("WORKERS", "1"))  # >1: one fetcher process per shard (see shard_worker.py)
+WARMUP = os.getenv("WARMUP", "1")  # set to "0" to skip background warm-up of clients and caches
+
+# imported after the port is bound, in this order (the breakdown is logged)
+HEAVY_MODULES = ("telegram.ext", "notifier", "numpy", "match_predictor", "pari_parser", "fetcher")
+
+startup = {"phase": "binding", "ready": False, "milestones": {}, "imports": {}}
+telegram_app = None  # set once the Application has started; the webhook answers 503 until then
+shard_supervisor = None
 
 def log(msg: str):
     t = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{t} UTC] {msg}", flush=True)
 
+def milestone(name: str):
+    seconds = time.perf_counter() - STARTUP_T0
+    startup["milestones"][name] = round(seconds, 3)
+    metrics.STARTUP_SECONDS.set(seconds, phase=name)
+    log(f"⏱ {name}: {seconds:.2f}s since start")
+
+def import_heavy_modules():
+    """Import HEAVY_MODULES one by one; each timing excludes modules already imported before it."""
+    for name in HEAVY_MODULES:
+        t0 = time.perf_counter()
+        importlib.import_module(name)
+        seconds = time.perf_counter() - t0
+        startup["imports"][name] = round(seconds, 3)
+        metrics.IMPORT_SECONDS.set(seconds, module=name)
+    return startup["imports"]
+
 # Telegram commands
-async def cmd_start(update, context: ContextTypes.DEFAULT_TYPE):
+async def cmd_start(update, context):
     await update.message.reply_text("🤖 Bot is running.")
 
-async def cmd_status(update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("✅ Bot is active.")
+def status_text() -> str:
+    """Live pipeline stats for /status."""
+    if shard_supervisor is not None:
+        totals = shard_supervisor.totals()
+        last, cycle_events, cycle_signals = totals["at"], totals["events"], totals["signals"]
+        hits, lookups = totals["cache_hits"], totals["cache_lookups"]
+        hit_ratio = hits / lookups if lookups else 0.0
+        scope = f"{len(shard_supervisor.cycles)}/{shard_supervisor.shards} shards"
+    else:
+        from fetcher import last_cycle
+        from match_predictor import cache_stats
+        last, cycle_events, cycle_signals = metrics.last_success, last_cycle.get("events", 0), last_cycle.get("signals", 0)
+        hit_ratio = cache_stats()["hit_ratio"]
+        scope = "1 worker"
+    if last is None:
+        cycle = "no cycle finished yet"
+    else:
+        at = datetime.datetime.utcfromtimestamp(last).strftime("%H:%M:%S")
+        cycle = f"last cycle {at} UTC ({time.time() - last:.0f}s ago)"
+    return (f"✅ Bot is active ({scope}), {cycle}\n"
+            f"📊 Last cycle: {cycle_events} events, {cycle_signals} signals\n"
+            f"📈 Since start: {metrics.EVENTS.value():.0f} events, {metrics.SIGNALS.value():.0f} signals, "
+            f"{metrics.CYCLES.value(status='ok'):.0f} cycles ({metrics.CYCLES.value(status='error'):.0f} failed)\n"
+            f"🗄 H2H cache hit rate: {hit_ratio:.0%}")
+
+async def cmd_status(update, context):
+    await update.message.reply_text(status_text())
 
 # Web healthcheck
 async def handle_root(request):
     return web.Response(text="✅ Bot is running on Render!")
 
+async def handle_metrics(request):
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+def _seen_healthcheck():
+    if "first_healthcheck" not in startup["milestones"]:
+        milestone("first_healthcheck")
+
+async def handle_healthz(request):
+    _seen_healthcheck()
+    healthy, age = metrics.health(HEALTH_MAX_CYCLE_AGE)
+    status = "ok" if healthy else "stale"
+    return web.json_response({"status": status, "last_cycle_age_seconds": round(age, 1)},
+                             status=200 if healthy else 503)
+
+async def handle_livez(request):
+    _seen_healthcheck()
+    return web.json_response({"status": "alive", "phase": startup["phase"]})
+
+async def handle_readyz(request):
+    _seen_healthcheck()
+    ready = startup["ready"]
+    return web.json_response({"status": "ready" if ready else "starting", "phase": startup["phase"],
+                              "milestones": startup["milestones"], "imports": startup["imports"]},
+                             status=200 if ready else 503)
+
+async def handle_telegram_webhook(request):
+    """Telegram update endpoint: check the secret token and hand the update to the Application."""
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not hmac.compare_digest(token, WEBHOOK_SECRET):
+        return web.Response(status=403)
+    if telegram_app is None:
+        return web.Response(status=503)  # still starting; Telegram retries
+    from telegram import Update
+    try:
+        data = await request.json()
+        if not isinstance(data, dict):
+            raise ValueError("update is not a JSON object")
+        update = Update.de_json(data, telegram_app.bot)
+    except Exception as e:
+        log(f"⚠️ Rejected webhook body: {e}")
+        return web.Response(status=400)
+    if update is None:
+        return web.Response(status=400)
+    await telegram_app.update_queue.put(update)
+    return web.Response()
+
+def register_metric_callbacks():
+    from browser_pool import get_browser_pool, process_tree_rss_mb
+    from match_predictor import cache_stats
+    from odds_store import get_odds_series
+
+    def h2h_stats():
+        # in shard mode the lookups happen in the workers; this process's cache stays unused
+        return shard_supervisor.h2h_stats() if shard_supervisor is not None else cache_stats()
+
+    metrics.register_callback("betfetcher_h2h_cache_hit_ratio", "Share of H2H lookups served from cache.",
+                              lambda: h2h_stats()["hit_ratio"])
+    metrics.register_callback("betfetcher_h2h_cache", "H2H cache counters and size.",
+                              lambda: {k: v for k, v in h2h_stats().items() if isinstance(v, (int, float)) and not isinstance(v, bool)})
+    metrics.register_callback("betfetcher_browser_pool", "Playwright pool counters.",
+                              lambda: {k: float(v) for k, v in get_browser_pool().stats().items()})
+    metrics.register_callback("process_tree_resident_memory_bytes", "RSS of the worker and its Chromium children.",
+                              lambda: int(process_tree_rss_mb() * 1024 * 1024))
+    metrics.register_callback("betfetcher_odds_series", "Odds time-series rows, flushes and dropped chunks.",
+                              lambda: dict(get_odds_series().stats))
+
 async def start_web_server(port):
     web_app = web.Application()
     web_app.router.add_get("/", handle_root)
+    web_app.router.add_get("/metrics", handle_metrics)
+    web_app.router.add_get("/healthz", handle_healthz)
+    web_app.router.add_get("/livez", handle_livez)
+    web_app.router.add_get("/readyz", handle_readyz)
+    if WEBHOOK_URL:
+        web_app.router.add_post(WEBHOOK_PATH, handle_telegram_webhook)
     runner = web.AppRunner(web_app)
     await runner.setup()
     site = web.TCPSite(runner, "0.0.0.0", port)
@@ -46,27 +184,113 @@ async def start_web_server(port):
     log(f"🌐 Web server started on port {port}")
     return runner
 
+async def warm_up():
+    """Open shared clients and load caches before the first cycle needs them (Chromium stays lazy)."""
+    from http_client import get_http_session
+    from odds_store import get_odds_series
+    from stats_fetcher_playwright import refresh_match_directory
+    t0 = time.perf_counter()
+    try:
+        get_http_session()
+        await asyncio.to_thread(get_odds_series)
+        await refresh_match_directory()
+    except Exception as e:
+        log(f"⚠️ Warm-up incomplete: {e}")
+    log(f"🔥 Warm-up finished in {time.perf_counter() - t0:.2f}s")
+
+async def run_pipeline(notifier):
+    """fetcher_loop, flipping readiness once the first cycle has finished."""
+    from fetcher import fetcher_loop
+    loop_task = asyncio.create_task(fetcher_loop(notifier, update_interval=UPDATE_INTERVAL))
+    try:
+        while metrics.last_success is None and not loop_task.done():
+            await asyncio.sleep(0.5)
+        if metrics.last_success is not None:
+            mark_ready()
+        await loop_task
+    finally:
+        loop_task.cancel()
+
+def mark_ready():
+    if not startup["ready"]:
+        startup["phase"] = "running"
+        startup["ready"] = True
+        milestone("first_cycle")
+
+async def run_shards(notifier):
+    """Supervise WORKERS shard processes fed from one fetch per cycle; their signals go out through this process's notifier."""
+    global shard_supervisor
+    from shard_worker import ShardSupervisor
+    supervisor = shard_supervisor = ShardSupervisor(WORKERS, UPDATE_INTERVAL)
+    supervisor.start()
+    log(f"🧩 Started {WORKERS} shard workers")
+
+    async def on_error(e):
+        try:
+            await notifier.notify(f"⚠️ Fetcher error: {e}")
+        except Exception:
+            pass
+
+    def on_cycle(totals):
+        # cycle, event and signal counters arrive from the workers (ShardSupervisor.forward)
+        mark_ready()
+
+    try:
+        await asyncio.gather(supervisor.watch(), supervisor.distribute(on_error),
+                             supervisor.forward(notifier.notify, on_cycle))
+    finally:
+        await asyncio.to_thread(supervisor.stop)
+
 async def main():
+    # bind the port before anything heavy is imported
+    runner = await start_web_server(HTTP_PORT)
+    milestone("port_bound")
+
+    startup["phase"] = "importing"
+    imports = await asyncio.to_thread(import_heavy_modules)
+    milestone("imports_done")
+    log("📦 Imports: " + ", ".join(f"{name} {sec:.2f}s" for name, sec in imports.items()))
+
+    from telegram.ext import Application, CommandHandler
+    from notifier import Notifier
+
+    startup["phase"] = "starting"
     application = Application.builder().token(BOT_TOKEN.strip()).build()
     application.add_handler(CommandHandler("start", cmd_start))
     application.add_handler(CommandHandler("status", cmd_status))
 
     notifier = Notifier(application.bot, ADMIN_CHAT_ID)
-
-    # start web server
-    runner = await start_web_server(HTTP_PORT)
+    register_metric_callbacks()
+    metrics.register_callback("betfetcher_notify_queue", "Telegram delivery queue counters.",
+                              lambda: {**notifier.stats, "backlog": notifier.backlog})
 
     # Initialize application without polling by default to avoid getUpdates conflicts
+    global telegram_app
     await application.initialize()
     await application.start()
-    if ENABLE_POLLING == "1":
+    polling = ENABLE_POLLING == "1" and not WEBHOOK_URL
+    if WEBHOOK_URL:
+        telegram_app = application
+        try:
+            await application.bot.set_webhook(url=WEBHOOK_URL + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET,
+                                              allowed_updates=["message"])
+            log(f"✅ Telegram webhook set to {WEBHOOK_URL}{WEBHOOK_PATH}")
+        except Exception as e:
+            log(f"⚠️ Telegram webhook not set: {e}")
+        if ENABLE_POLLING == "1":
+            log("ℹ️ ENABLE_POLLING ignored: WEBHOOK_URL is set")
+    elif polling:
         await application.updater.start_polling()
         log("✅ Telegram polling started (ENABLE_POLLING=1)")
     else:
         log("ℹ️ Telegram initialized (polling disabled)")
+    milestone("telegram_started")
+
+    warm_task = asyncio.create_task(warm_up()) if WARMUP == "1" and WORKERS <= 1 else None
 
     # start fetcher loop in background
-    fetcher_task = asyncio.create_task(fetcher_loop(notifier, update_interval=UPDATE_INTERVAL))
+    startup["phase"] = "first_cycle"
+    fetcher_task = asyncio.create_task(run_shards(notifier) if WORKERS > 1 else run_pipeline(notifier))
 
     # notify admin
     try:
@@ -85,13 +309,31 @@ async def main():
     await stop_event.wait()
     log("🛑 Shutdown initiated")
 
-    fetcher_task.cancel()
-    try:
-        await fetcher_task
-    except asyncio.CancelledError:
-        pass
+    for task in (fetcher_task, warm_task):
+        if task is None:
+            continue
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    from browser_pool import shutdown_browser_pool
+    from http_client import close_http_session
+    from match_predictor import h2h_cache
+    from odds_store import get_odds_series
+    from pari_parser import shutdown_parse_executor
+
+    await notifier.close()
+    await shutdown_browser_pool()
+    await close_http_session()
+    shutdown_parse_executor()
+    h2h_cache.close()
+    get_odds_series().close()
 
-    if ENABLE_POLLING == "1":
+    # the webhook stays registered: the next instance (same URL) takes it over
+    telegram_app = None
+    if polling:
         await application.updater.stop_polling()
     await application.stop()
     await application.shutdown()
@@ -1,65 +1,251 @@
 # match_predictor.py - H2H + odds-based predictor with caching
 import asyncio
-import re
+import json
+import os
 import time
+
+import numpy as np
 try:
-    from stats_fetcher_playwright import fetch_h2h as _fetch_h2h
+    from stats_fetcher_playwright import resolve_match as _resolve_match, fetch_h2h_for_match as _fetch_h2h_for_match
 except Exception:
-    _fetch_h2h = None
+    _resolve_match = None
+    _fetch_h2h_for_match = None
+
+from h2h_cache import H2HCache
+from odds_store import get_odds_series
+from team_resolver import normalize, split_teams
+
+MODEL_WEIGHTS_PATH = os.getenv("MODEL_WEIGHTS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_weights.json"))
+DEFAULT_WEIGHTS = {
+    "h2h": 0.6,               # weight of the H2H favourite ratio
+    "implied": 0.4,           # weight of 1/odds when H2H is known
+    "fallback_implied": 0.5,  # without H2H: implied shrunk toward 0.5 by this share
+    "score_diff": 0.0,        # per goal of lead for the selection
+    "time_lead": 0.0,         # elapsed share of the match times the sign of the lead
+    "odds_momentum": 0.0,     # relative shortening of the odds over the recent snapshots
+    "momentum_window": 8,     # snapshots looked back for the momentum feature
+    "match_minutes": 90,
+    "min_prob": 0.0,
+    "max_prob": 0.99,
+}
+
+h2h_cache = H2HCache()
+
+def load_weights(path: str = None) -> dict:
+    """Model weights from JSON (missing keys keep their defaults)."""
+    weights = dict(DEFAULT_WEIGHTS)
+    path = path or MODEL_WEIGHTS_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            weights.update({k: v for k, v in json.load(f).items() if k in DEFAULT_WEIGHTS or k == "version"})
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Model weights not loaded from {path}: {e}")
+    return weights
+
+WEIGHTS = load_weights()
 
-_h2h_cache = {}  # key -> (ts, data)
-H2H_TTL = 3600  # seconds
+def reload_weights(path: str = None) -> dict:
+    global WEIGHTS
+    WEIGHTS = load_weights(path)
+    return WEIGHTS
 
 def norm(name: str):
-    return re.sub(r'[^a-zA-Z0-9\\s]','', name).strip().lower()
-
-async def fetch_h2h_cached(team1, team2):
-    key = f"{norm(team1)}|{norm(team2)}"
-    now = time.time()
-    cached = _h2h_cache.get(key)
-    if cached and now - cached[0] < H2H_TTL:
-        return cached[1]
-    if _fetch_h2h:
-        try:
-            data = await _fetch_h2h('', team1=team1, team2=team2, limit=8)
-            _h2h_cache[key] = (now, data)
-            return data
-        except Exception:
+    return normalize(name)
+
+def h2h_summary(matches, r1, r2, team1=None, team2=None):
+    """
+    Win/draw counts for the pair from H2H rows (winner_id when the feed gave one, else winner name).
+    Rows whose result cannot be credited to either team are skipped; None when no row can be.
+    """
+    if not matches:
+        return None
+    names1 = {normalize(r1.name or ""), normalize(team1 or "")} - {""}
+    names2 = {normalize(r2.name or ""), normalize(team2 or "")} - {""}
+    a = b = draws = 0
+    for m in matches:
+        winner_id = m.get("winner_id")
+        winner = m.get("winner")
+        if winner_id is not None:
+            a += winner_id == r1.participant_id
+            b += winner_id == r2.participant_id
+        elif winner == "Draw":
+            draws += 1
+        elif winner:
+            key = normalize(winner)
+            a += key in names1
+            b += key in names2
+    total = a + b + draws
+    if not total:
+        return None
+    return {"a_wins": a, "b_wins": b, "draws": draws, "total": total}
+
+_live_inflight = 0  # live (non-prefetch) H2H lookups running right now
+
+def live_lookups_inflight() -> int:
+    return _live_inflight
+
+async def fetch_h2h_cached(team1, team2, prefetch: bool = False):
+    """
+    H2H summary ({a_wins, b_wins, draws, total}) for a bookmaker team pair.
+    Pairs that do not resolve to a Flashscore match are not looked up.
+    Live lookups are counted so the prefetcher (prefetch=True) can yield to them.
+    """
+    global _live_inflight
+    if not _resolve_match:
+        return None
+    if not prefetch:
+        _live_inflight += 1
+    try:
+        match_id, r1, r2 = await _resolve_match(team1, team2)
+        if not match_id:
             return None
-    return None
+        key = f"{r1.participant_id}|{r2.participant_id}"
+        matches = await h2h_cache.get(key, lambda: _fetch_h2h_for_match(match_id, team1=team1, team2=team2, limit=8))
+        return h2h_summary(matches, r1, r2, team1, team2)
+    finally:
+        if not prefetch:
+            _live_inflight -= 1
 
-async def analyze_event(event: dict) -> float:
+def cache_stats() -> dict:
+    return h2h_cache.stats()
+
+def parse_minutes(timer) -> float:
+    """"67:12" -> 67.2; None/garbage -> 0."""
+    if not timer:
+        return 0.0
+    mins, _, secs = str(timer).partition(":")
+    try:
+        return int(mins) + (int(secs) / 60.0 if secs.isdigit() else 0.0)
+    except ValueError:
+        return 0.0
+
+def parse_score_diff(score, outcome=None) -> int:
+    """Lead of the selection from "2:0 (1:0)"; the away side for outcome "2", else the home side."""
+    if not score:
+        return 0
+    home, sep, away = str(score).split(" ", 1)[0].partition(":")
+    if not sep or not home.isdigit() or not away.isdigit():
+        return 0
+    diff = int(home) - int(away)
+    return -diff if outcome == "2" else diff
+
+def record_snapshots(events, now: float = None):
+    """Append this cycle's odds/score/minute of every keyed event to the odds time series."""
+    keyed = [ev for ev in events if ev.get('key') and ev.get('odds')]
+    if not keyed:
+        return
+    get_odds_series().append_many(
+        [ev['key'] for ev in keyed],
+        time.time() if now is None else now,
+        [float(ev['odds']) for ev in keyed],
+        [parse_score_diff(ev.get('score'), ev.get('outcome')) for ev in keyed],
+        [parse_minutes(ev.get('timer')) for ev in keyed],
+    )
+
+def odds_trend(key: str, window: int = 8) -> float:
+    """Relative shortening of the odds over the last `window` snapshots (>0: odds fell)."""
+    odds = get_odds_series().last(key, window)["odds"]
+    if len(odds) < 2 or not odds[0]:
+        return 0.0
+    return float((odds[0] - odds[-1]) / odds[0])
+
+def event_columns(events, h2h_summaries, weights: dict = None) -> dict:
+    """Columnar arrays for score_batch from event dicts and their H2H summaries (None when unknown)."""
+    w = weights or WEIGHTS
+    n = len(events)
+    cols = {
+        "odds": np.empty(n, dtype=np.float64),
+        "h2h_a": np.zeros(n, dtype=np.float64),
+        "h2h_b": np.zeros(n, dtype=np.float64),
+        "h2h_draws": np.zeros(n, dtype=np.float64),
+        "has_h2h": np.zeros(n, dtype=bool),
+        "time_elapsed": np.zeros(n, dtype=np.float64),
+        "score_diff": np.zeros(n, dtype=np.float64),
+        "odds_trend": np.zeros(n, dtype=np.float64),
+    }
+    window = int(w["momentum_window"])
+    match_minutes = float(w["match_minutes"]) or 90.0
+    for i, (ev, h2h) in enumerate(zip(events, h2h_summaries)):
+        cols["odds"][i] = float(ev.get('odds') or 1.0)
+        if h2h:
+            cols["has_h2h"][i] = True
+            cols["h2h_a"][i] = h2h.get('a_wins') or 0
+            cols["h2h_b"][i] = h2h.get('b_wins') or 0
+            cols["h2h_draws"][i] = h2h.get('draws') or 0
+        cols["time_elapsed"][i] = min(1.0, parse_minutes(ev.get('timer')) / match_minutes)
+        cols["score_diff"][i] = parse_score_diff(ev.get('score'), ev.get('outcome'))
+        if w["odds_momentum"] and ev.get('key'):
+            cols["odds_trend"][i] = odds_trend(ev['key'], window)
+    return cols
+
+def score_batch(odds, h2h_a=None, h2h_b=None, h2h_draws=None, has_h2h=None,
+                time_elapsed=None, score_diff=None, odds_trend=None, weights: dict = None):
     """
-    Returns estimated probability (0..1) that the specified selection will win.
-    Strategy:
-      - Try H2H via Playwright parser if available.
-      - Combine H2H win ratio and implied odds to produce probability.
+    Win probabilities for a whole cycle in one vectorized pass.
+    With H2H:    h2h * max(a, b) / max(1, a + b + draws) + implied * (1 / odds)
+    Without H2H: fallback_implied * (1 / odds) + (1 - fallback_implied) * 0.5
+    plus score_diff * lead + time_lead * elapsed * sign(lead) + odds_momentum * trend,
+    clipped to [min_prob, max_prob].
     """
-    odds = float(event.get('odds') or 1.0)
-    teams = event.get('teams','')
-    # split teams heuristically by common separators
-    parts = [p.strip() for p in re.split(r'[-–—vsVS@]', teams) if p.strip()]
-    team1 = parts[0] if parts else None
-    team2 = parts[1] if len(parts)>1 else None
-
-    # Try H2H
+    w = weights or WEIGHTS
+    odds = np.asarray(odds, dtype=np.float64)
+    zeros = np.zeros_like(odds)
+    a = zeros if h2h_a is None else np.asarray(h2h_a, dtype=np.float64)
+    b = zeros if h2h_b is None else np.asarray(h2h_b, dtype=np.float64)
+    d = zeros if h2h_draws is None else np.asarray(h2h_draws, dtype=np.float64)
+    has = np.zeros(odds.shape, dtype=bool) if has_h2h is None else np.asarray(has_h2h, dtype=bool)
+
+    implied = np.full_like(odds, 0.5)
+    np.divide(1.0, odds, out=implied, where=odds > 0)
+    favorite_ratio = np.maximum(a, b) / np.maximum(1.0, a + b + d)
+    with_h2h = w["h2h"] * favorite_ratio + w["implied"] * implied
+    without = w["fallback_implied"] * implied + (1.0 - w["fallback_implied"]) * 0.5
+    prob = np.where(has, with_h2h, without)
+
+    if score_diff is not None and (w["score_diff"] or w["time_lead"]):
+        lead = np.asarray(score_diff, dtype=np.float64)
+        prob = prob + w["score_diff"] * lead
+        if time_elapsed is not None:
+            prob = prob + w["time_lead"] * np.asarray(time_elapsed, dtype=np.float64) * np.sign(lead)
+    if odds_trend is not None and w["odds_momentum"]:
+        prob = prob + w["odds_momentum"] * np.asarray(odds_trend, dtype=np.float64)
+    return np.clip(prob, w["min_prob"], w["max_prob"])
+
+def score_events(events, h2h_summaries, weights: dict = None):
+    return score_batch(**event_columns(events, h2h_summaries, weights), weights=weights)
+
+def odds_only_probability(odds: float) -> float:
+    """Implied probability shrunk toward 0.5, used when no H2H data is available."""
+    return float(score_batch([odds])[0])
+
+def event_teams(event: dict):
+    team1 = event.get('team1')
+    team2 = event.get('team2')
+    if not (team1 and team2):
+        # scraped events only carry a title like "Team A — Team B"
+        team1, team2 = split_teams(event.get('teams',''))
+    return team1, team2
+
+async def event_h2h(event: dict):
+    team1, team2 = event_teams(event)
+    if not (team1 and team2):
+        return None
     try:
-        if team1 and team2:
-            h2h = await fetch_h2h_cached(team1, team2)
-            if h2h and isinstance(h2h, dict):
-                a = h2h.get('a_wins') or h2h.get('wins_a') or h2h.get('wins1') or 0
-                b = h2h.get('b_wins') or h2h.get('wins_b') or h2h.get('wins2') or 0
-                draws = h2h.get('draws') or 0
-                total = max(1, a + b + draws)
-                favorite_ratio = max(a,b)/total
-                implied = 1.0/odds if odds>0 else 0.5
-                # combine: 60% H2H, 40% implied
-                prob = 0.6*favorite_ratio + 0.4*implied
-                return min(0.99, max(0.0, prob))
+        return await fetch_h2h_cached(team1, team2)
     except Exception:
-        pass
+        return None
+
+async def analyze_events_batch(events, weights: dict = None):
+    """H2H for all events concurrently, then one score_batch call; returns a probability array."""
+    summaries = await asyncio.gather(*(event_h2h(ev) for ev in events))
+    return score_events(events, summaries, weights)
 
-    # Fallback: implied odds shrunk toward 0.5
-    implied = 1.0/odds if odds>0 else 0.5
-    prob = 0.5*(implied + 0.5)
-    return min(0.99, max(0.0, prob))
+async def analyze_event(event: dict) -> float:
+    """
+    Returns estimated probability (0..1) that the specified selection will win.
+    Thin wrapper over score_batch for a single event (H2H via the cached Flashscore lookup).
+    """
+    h2h = await event_h2h(event)
+    return float(score_events([event], [h2h])[0])
@@ -0,0 +1,217 @@
+# metrics.py - minimal Prometheus text-format metrics (no client library needed)
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry = []
+_callbacks = []
+
+START_TIME = time.time()
+last_success = None  # unix time of the last successful fetch cycle
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _fmt_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def merge(self, values: dict):
+        for key, v in values.items():
+            self._values[key] = self._values.get(key, 0) + v
+
+    def render(self):
+        lines = self.header()
+        for key, v in sorted(self._values.items()):
+            lines.append(f"{self.name}{_fmt_labels(self.labelnames, key)} {_fmt_value(v)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def merge(self, series: dict):
+        for key, other in series.items():
+            mine = self._series.get(key)
+            if mine is None:
+                self._series[key] = list(other)
+            else:
+                self._series[key] = [a + b for a, b in zip(mine, other)]
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def render(self):
+        lines = self.header()
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for i, upper in enumerate(self.buckets):
+                cumulative += series[i]
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, ('le', _fmt_value(float(upper))))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_value(series[-2])}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+def take_deltas() -> dict:
+    """
+    Counter and histogram values recorded since the previous call, by metric name; the local
+    series start over. Shard workers send these to the supervisor, which serves /metrics.
+    """
+    out = {}
+    for metric in _registry:
+        if isinstance(metric, Histogram):
+            values, metric._series = metric._series, {}
+        elif isinstance(metric, Counter) and not isinstance(metric, Gauge):
+            values, metric._values = metric._values, {}
+        else:
+            continue
+        if values:
+            out[metric.name] = values
+    return out
+
+
+def merge_deltas(deltas: dict):
+    """Add another process's take_deltas() to the metrics of the same name; unknown names are ignored."""
+    by_name = {metric.name: metric for metric in _registry}
+    for name, values in deltas.items():
+        metric = by_name.get(name)
+        if metric is not None:
+            metric.merge(values)
+
+
+def register_callback(name: str, help: str, fn, kind: str = "gauge"):
+    """Expose `fn()` at scrape time; a dict result becomes one series per key (label `key`)."""
+    _callbacks.append((name, help, kind, fn))
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for name, help, kind, fn in _callbacks:
+        try:
+            value = fn()
+        except Exception:
+            continue
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        if isinstance(value, dict):
+            for label, v in sorted(value.items()):
+                lines.append(f'{name}{{key="{label}"}} {_fmt_value(v)}')
+        else:
+            lines.append(f"{name} {_fmt_value(value)}")
+    lines.append("# HELP process_resident_memory_bytes Resident memory size of the worker process.")
+    lines.append("# TYPE process_resident_memory_bytes gauge")
+    lines.append(f"process_resident_memory_bytes {_rss_bytes()}")
+    lines.append("# HELP process_start_time_seconds Start time of the process since unix epoch.")
+    lines.append("# TYPE process_start_time_seconds gauge")
+    lines.append(f"process_start_time_seconds {_fmt_value(START_TIME)}")
+    return "\n".join(lines) + "\n"
+
+
+def mark_cycle_success():
+    global last_success
+    last_success = time.time()
+
+
+def health(max_age: float):
+    """(healthy, seconds since the last successful cycle, or since start if none yet)."""
+    ref = last_success if last_success is not None else START_TIME
+    age = time.time() - ref
+    return age <= max_age, age
+
+
+STAGE_SECONDS = Histogram("betfetcher_stage_seconds", "Latency of pipeline stages.", ("stage",))
+H2H_SECONDS = Histogram("betfetcher_h2h_seconds", "Latency of H2H lookups by source.", ("source", "result"))
+CYCLE_SECONDS = Histogram("betfetcher_cycle_seconds", "Duration of a full fetch cycle.")
+CYCLES = Counter("betfetcher_cycles_total", "Fetch cycles by outcome.", ("status",))
+CYCLE_OVERRUNS = Counter("betfetcher_cycle_overruns_total", "Cycles that took longer than the update interval.")
+EVENTS = Counter("betfetcher_events_total", "Candidate events seen.")
+EVENTS_SCORED = Counter("betfetcher_events_scored_total", "Events run through analyze_event.", ("result",))
+SIGNALS = Counter("betfetcher_signals_total", "Signals queued to Telegram.")
+LAST_CYCLE_EVENTS = Gauge("betfetcher_last_cycle_events", "Candidate events in the last cycle.")
+STARTUP_SECONDS = Gauge("betfetcher_startup_seconds", "Seconds from process start to each startup milestone.", ("phase",))
+IMPORT_SECONDS = Gauge("betfetcher_import_seconds", "Time spent importing each heavy module at startup.", ("module",))
@@ -1,25 +1,177 @@
-# notifier.py - simple wrapper around telegram Bot to send admin messages
-from telegram import Bot
+# notifier.py - queued, rate-limited wrapper around telegram Bot to send admin messages
 import asyncio
+import os
+import time
+from collections import deque
+
+from telegram import Bot
+
+import metrics
+
+try:
+    from telegram.error import RetryAfter
+except ImportError:
+    RetryAfter = None
+
+TELEGRAM_MAX_LEN = 4096
+NOTIFY_RATE = float(os.getenv("NOTIFY_RATE", "1"))  # messages per second to one chat
+NOTIFY_BURST = int(os.getenv("NOTIFY_BURST", "3"))
+NOTIFY_DIGEST_WINDOW = float(os.getenv("NOTIFY_DIGEST_WINDOW", "2"))  # seconds to gather a digest
+NOTIFY_MAX_BACKLOG = int(os.getenv("NOTIFY_MAX_BACKLOG", "200"))
+NOTIFY_DROP_POLICY = os.getenv("NOTIFY_DROP_POLICY", "oldest")  # oldest | newest
+NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "3"))
+
+
+def split_message(text: str, limit: int = TELEGRAM_MAX_LEN):
+    """Split on line boundaries into chunks of at most `limit` characters; over-long lines are cut."""
+    chunks = []
+    current = ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = candidate
+    if current or not chunks:
+        chunks.append(current)
+    return chunks
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Drain the bucket so nothing is sent for `seconds` (used for Telegram's retry_after)."""
+        self.tokens = -seconds * self.rate
+        self.updated = time.monotonic()
+
 
 class Notifier:
-    def __init__(self, bot_or_token, admin_id):
+    """
+    `notify` only queues the message. A background task gathers messages that
+    arrive within NOTIFY_DIGEST_WINDOW into one digest, splits it at Telegram's
+    4096-character limit and sends it through a token bucket, honouring retry_after.
+    When the backlog is full the oldest (or the new) message is dropped.
+    """
+
+    def __init__(self, bot_or_token, admin_id, rate: float = NOTIFY_RATE, burst: int = NOTIFY_BURST,
+                 digest_window: float = NOTIFY_DIGEST_WINDOW, max_backlog: int = NOTIFY_MAX_BACKLOG,
+                 drop_policy: str = NOTIFY_DROP_POLICY):
         # bot_or_token: Application.bot or token string
         if hasattr(bot_or_token, 'send_message'):
             self.bot = bot_or_token
         else:
             self.bot = Bot(token=bot_or_token)
         self.admin_id = admin_id
+        self.digest_window = digest_window
+        self.max_backlog = max_backlog
+        self.drop_policy = drop_policy
+        self._bucket = TokenBucket(rate, burst)
+        self._queue = deque()
+        self._wakeup = None
+        self._worker = None
+        self._busy = False
+        self.stats = {"queued": 0, "sent": 0, "digests": 0, "dropped": 0, "retries": 0, "failed": 0}
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
 
     async def notify(self, text: str):
+        """Queue `text` for delivery and return immediately."""
+        self._ensure_worker()
+        if len(self._queue) >= self.max_backlog:
+            self.stats["dropped"] += 1
+            if self.drop_policy == "newest":
+                return
+            self._queue.popleft()
+        self._queue.append(text)
+        self.stats["queued"] += 1
+        self._wakeup.set()
+
+    @property
+    def backlog(self) -> int:
+        return len(self._queue)
+
+    async def _run(self):
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            if self.digest_window > 0:
+                await asyncio.sleep(self.digest_window)
+            batch = list(self._queue)
+            self._queue.clear()
+            if len(batch) > 1:
+                self.stats["digests"] += 1
+            self._busy = True
+            try:
+                for chunk in split_message("\n\n".join(batch)):
+                    await self._deliver(chunk)
+            finally:
+                self._busy = False
+
+    async def _deliver(self, text: str):
+        for attempt in range(NOTIFY_MAX_RETRIES + 1):
+            await self._bucket.acquire()
+            try:
+                with metrics.STAGE_SECONDS.time(stage="notify"):
+                    await self._send(text)
+                self.stats["sent"] += 1
+                return
+            except Exception as e:
+                if RetryAfter is not None and isinstance(e, RetryAfter):
+                    wait = e.retry_after
+                    wait = wait.total_seconds() if hasattr(wait, "total_seconds") else float(wait)
+                    self._bucket.pause(wait)
+                else:
+                    await asyncio.sleep(min(2 ** attempt, 30))
+                print("Notifier error:", e)
+                self.stats["retries"] += 1
+        self.stats["failed"] += 1
+
+    async def _send(self, text: str):
+        # send_message is sync in Bot, but Application.bot has async send_message
+        send = getattr(self.bot, 'send_message', None)
+        if asyncio.iscoroutinefunction(send):
+            await send(chat_id=self.admin_id, text=text)
+        else:
+            # run sync send_message in executor
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, lambda: self.bot.send_message(chat_id=self.admin_id, text=text))
+
+    async def close(self, timeout: float = 10):
+        """Flush what is queued (up to `timeout` seconds) and stop the delivery task."""
+        if self._worker is None:
+            return
+        deadline = time.monotonic() + timeout
+        while (self._queue or self._busy) and time.monotonic() < deadline and not self._worker.done():
+            await asyncio.sleep(0.1)
+        self._worker.cancel()
         try:
-            # send_message is sync in Bot, but Application.bot has async send_message
-            send = getattr(self.bot, 'send_message', None)
-            if asyncio.iscoroutinefunction(send):
-                await send(chat_id=self.admin_id, text=text[:4000])
-            else:
-                # run sync send_message in executor
-                loop = asyncio.get_event_loop()
-                await loop.run_in_executor(None, lambda: self.bot.send_message(chat_id=self.admin_id, text=text[:4000]))
-        except Exception as e:
-            print("Notifier error:", e)
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
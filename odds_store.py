@@ -0,0 +1,350 @@
+# odds_store.py - append-only columnar time series of per-event odds/score snapshots
+#
+# Rows are appended to an in-memory chunk of fixed-capacity NumPy columns. A full
+# chunk is written as one .npy file per column (ODDS_SERIES_DIR/<chunk>/<column>.npy)
+# and re-opened memory-mapped, so reads are zero-copy views. The partially filled
+# chunk is rewritten every ODDS_SERIES_FLUSH seconds and on close(). Chunks whose
+# newest row is older than ODDS_SERIES_RETENTION are dropped by compact().
+# Appends never touch the disk: full chunks wait in memory until maintain(),
+# which writes them (and the periodic flush) in a worker thread.
+import asyncio
+import hashlib
+import os
+import shutil
+import time
+from collections import deque
+
+import numpy as np
+
+ODDS_SERIES_DIR = os.getenv("ODDS_SERIES_DIR", "odds_series")  # empty = memory only
+ODDS_SERIES_RETENTION = float(os.getenv("ODDS_SERIES_RETENTION", str(24 * 3600)))
+ODDS_SERIES_CHUNK = int(os.getenv("ODDS_SERIES_CHUNK", "8192"))  # rows per chunk
+ODDS_SERIES_TAIL = int(os.getenv("ODDS_SERIES_TAIL", "32"))  # most recent rows indexed per event
+ODDS_SERIES_FLUSH = float(os.getenv("ODDS_SERIES_FLUSH", "60"))
+
+COLUMNS = (
+    ("ts", np.float64),
+    ("event", np.uint64),      # event_hash(key)
+    ("odds", np.float32),
+    ("score_diff", np.int16),  # lead of the selection
+    ("minute", np.float32),
+)
+
+
+def event_hash(key: str) -> int:
+    """Stable 64-bit id for an EventStateStore key (same across restarts, unlike hash())."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class _Chunk:
+    __slots__ = ("chunk_id", "cols", "size", "flushed_size")
+
+    def __init__(self, chunk_id, cols, size):
+        self.chunk_id = chunk_id
+        self.cols = cols
+        self.size = size
+        self.flushed_size = size
+
+    @classmethod
+    def empty(cls, chunk_id: int, capacity: int):
+        return cls(chunk_id, {name: np.empty(capacity, dtype) for name, dtype in COLUMNS}, 0)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.cols["ts"])
+
+    def view(self) -> dict:
+        return {name: arr[:self.size] for name, arr in self.cols.items()}
+
+
+class OddsSeries:
+    def __init__(self, path: str = ODDS_SERIES_DIR, retention: float = ODDS_SERIES_RETENTION,
+                 chunk_rows: int = ODDS_SERIES_CHUNK, tail: int = ODDS_SERIES_TAIL,
+                 flush_interval: float = ODDS_SERIES_FLUSH):
+        self.path = path
+        self.retention = retention
+        self.chunk_rows = max(16, chunk_rows)
+        self.tail = max(2, tail)
+        self.flush_interval = flush_interval
+        self._chunks = {}       # chunk_id -> _Chunk, oldest first; the last one is active
+        self._index = {}        # event hash -> deque of (chunk_id, row), oldest first
+        self._restored_until = None  # (chunk_id, row) of the first row appended in this process
+        self._backfilled = set()
+        self._unsealed = []     # full chunks not written yet (written by maintain or flush)
+        self._maintaining = False
+        self._flushed_at = time.monotonic()
+        self.stats = {"rows": 0, "appended": 0, "flushes": 0, "chunks_dropped": 0}
+        self._load()
+        if not self._chunks:
+            self._chunks[0] = _Chunk.empty(0, self.chunk_rows)
+        active = self._active
+        self._restored_until = (active.chunk_id, active.size)
+
+    @property
+    def _active(self) -> _Chunk:
+        return self._chunks[next(reversed(self._chunks))]
+
+    def __len__(self):
+        return sum(c.size for c in self._chunks.values())
+
+    # -- persistence -------------------------------------------------------
+
+    def _chunk_dir(self, chunk_id: int) -> str:
+        return os.path.join(self.path, f"{chunk_id:08d}")
+
+    def _load(self):
+        if not self.path or not os.path.isdir(self.path):
+            return
+        ids = sorted(int(d) for d in os.listdir(self.path) if d.isdigit())
+        for chunk_id in ids:
+            try:
+                cols = {name: np.load(os.path.join(self._chunk_dir(chunk_id), f"{name}.npy"), mmap_mode="r")
+                        for name, _ in COLUMNS}
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Odds chunk {chunk_id} not loaded: {e}")
+                continue
+            size = len(cols["ts"])
+            if size and any(len(c) != size for c in cols.values()):
+                print(f"⚠️ Odds chunk {chunk_id} has ragged columns, skipped")
+                continue
+            self._chunks[chunk_id] = _Chunk(chunk_id, cols, size)
+        if self._chunks:
+            # keep appending to a partially filled last chunk
+            last = self._active
+            if last.size < self.chunk_rows:
+                fresh = _Chunk.empty(last.chunk_id, self.chunk_rows)
+                for name, arr in last.cols.items():
+                    fresh.cols[name][:last.size] = arr
+                fresh.size = fresh.flushed_size = last.size
+                self._chunks[last.chunk_id] = fresh
+            else:
+                nxt = last.chunk_id + 1
+                self._chunks[nxt] = _Chunk.empty(nxt, self.chunk_rows)
+        self.stats["rows"] = len(self)
+        self.compact()
+
+    @staticmethod
+    def _write_columns(d: str, cols: dict):
+        """Write {column: array} as .npy files in `d` (no instance state: safe in a worker thread)."""
+        os.makedirs(d, exist_ok=True)
+        for name, arr in cols.items():
+            tmp = os.path.join(d, f"{name}.npy.tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(arr))
+            os.replace(tmp, os.path.join(d, f"{name}.npy"))
+
+    def _open_mmap(self, chunk_id: int) -> dict:
+        d = self._chunk_dir(chunk_id)
+        return {name: np.load(os.path.join(d, f"{name}.npy"), mmap_mode="r") for name, _ in COLUMNS}
+
+    def _seal_io(self, chunk: _Chunk) -> dict:
+        """Write a full chunk and open its files memory-mapped; a sealed chunk no longer changes."""
+        self._write_columns(self._chunk_dir(chunk.chunk_id), chunk.view())
+        return self._open_mmap(chunk.chunk_id)
+
+    def _sealed(self, chunk: _Chunk, cols: dict):
+        chunk.cols = cols
+        chunk.flushed_size = chunk.size
+        self.stats["flushes"] += 1
+
+    def _active_snapshot(self):
+        """(chunk, size, copied columns) of unwritten active rows, or None; the copy can be written off-loop."""
+        active = self._active
+        if active.size == active.flushed_size:
+            return None
+        return active, active.size, {name: arr.copy() for name, arr in active.view().items()}
+
+    def _flush_done(self, snapshot):
+        if snapshot is not None:
+            chunk, size, _ = snapshot
+            chunk.flushed_size = max(chunk.flushed_size, size)
+            self.stats["flushes"] += 1
+        self._flushed_at = time.monotonic()
+
+    def _flush_due(self, force: bool) -> bool:
+        return bool(self.path) and (force or time.monotonic() - self._flushed_at >= self.flush_interval)
+
+    def flush(self, force: bool = True):
+        """Write pending full chunks and the partially filled one (every `flush_interval` seconds unless `force`), blocking."""
+        if not self.path:
+            return
+        for chunk in self._take_unsealed():
+            self._sealed(chunk, self._seal_io(chunk))
+        if self._flush_due(force):
+            snapshot = self._active_snapshot()
+            if snapshot is not None:
+                self._write_columns(self._chunk_dir(snapshot[0].chunk_id), snapshot[2])
+            self._flush_done(snapshot)
+
+    async def flush_async(self, force: bool = False):
+        """flush() with the file I/O in a worker thread."""
+        if not self.path:
+            return
+        for chunk in self._take_unsealed():
+            self._sealed(chunk, await asyncio.to_thread(self._seal_io, chunk))
+        if self._flush_due(force):
+            snapshot = self._active_snapshot()
+            if snapshot is not None:
+                await asyncio.to_thread(self._write_columns, self._chunk_dir(snapshot[0].chunk_id), snapshot[2])
+            self._flush_done(snapshot)
+
+    def _take_unsealed(self):
+        pending, self._unsealed = self._unsealed, []
+        return [c for c in pending if self._chunks.get(c.chunk_id) is c]
+
+    def close(self):
+        self.flush(force=True)
+
+    # -- writes --------------------------------------------------------------
+
+    def append_many(self, keys, ts, odds, score_diff, minute):
+        """Append one row per key; columns may be sequences or arrays of the same length."""
+        n = len(keys)
+        if not n:
+            return
+        hashes = np.fromiter((event_hash(k) for k in keys), dtype=np.uint64, count=n)
+        data = {
+            "ts": np.broadcast_to(np.asarray(ts, dtype=np.float64), (n,)),
+            "event": hashes,
+            "odds": np.asarray(odds, dtype=np.float32),
+            "score_diff": np.asarray(score_diff, dtype=np.int16),
+            "minute": np.asarray(minute, dtype=np.float32),
+        }
+        done = 0
+        while done < n:
+            active = self._active
+            if active.size == active.capacity:
+                if self.path:
+                    self._unsealed.append(active)  # written by maintain()/flush(), not here
+                nxt = active.chunk_id + 1
+                self._chunks[nxt] = active = _Chunk.empty(nxt, self.chunk_rows)
+            take = min(n - done, active.capacity - active.size)
+            start = active.size
+            for name, arr in data.items():
+                active.cols[name][start:start + take] = arr[done:done + take]
+            for i in range(take):
+                h = int(hashes[done + i])
+                rows = self._index.get(h)
+                if rows is None:
+                    rows = self._index[h] = deque(maxlen=self.tail)
+                rows.append((active.chunk_id, start + i))
+            active.size += take
+            done += take
+        self.stats["rows"] += n
+        self.stats["appended"] += n
+
+    def append(self, key: str, ts: float, odds: float, score_diff: int = 0, minute: float = 0.0):
+        self.append_many([key], ts, [odds], [score_diff], [minute])
+
+    # -- reads ---------------------------------------------------------------
+
+    def _backfill(self, h: int, rows: deque):
+        """First read of an event after a restart: find its rows in the restored chunks."""
+        self._backfilled.add(h)
+        stop_chunk, stop_row = self._restored_until
+        found = []
+        need = self.tail - len(rows)
+        for chunk_id in reversed(self._chunks):
+            if chunk_id > stop_chunk or need <= 0:
+                continue
+            chunk = self._chunks[chunk_id]
+            limit = stop_row if chunk_id == stop_chunk else chunk.size
+            hits = np.flatnonzero(chunk.cols["event"][:limit] == np.uint64(h))[-need:]
+            found[:0] = [(chunk_id, int(r)) for r in hits]
+            need -= len(hits)
+        for pos in reversed(found):
+            rows.appendleft(pos)
+
+    def last(self, key: str, n: int = None) -> dict:
+        """The `n` most recent snapshots of `key`, oldest first, as {column: array}."""
+        n = self.tail if n is None else min(n, self.tail)
+        h = event_hash(key)
+        rows = self._index.get(h)
+        if h not in self._backfilled and self._restored_until != (0, 0):
+            if rows is None:
+                rows = self._index[h] = deque(maxlen=self.tail)
+            self._backfill(h, rows)
+        positions = [p for p in (rows or ()) if p[0] in self._chunks][-n:] if n > 0 else []
+        if not positions:
+            return {name: np.empty(0, dtype) for name, dtype in COLUMNS}
+        # rows of one event sit in at most a few chunks: one fancy-index gather per chunk
+        parts = {name: [] for name, _ in COLUMNS}
+        start = 0
+        while start < len(positions):
+            chunk_id = positions[start][0]
+            end = start
+            while end < len(positions) and positions[end][0] == chunk_id:
+                end += 1
+            idx = np.fromiter((r for _, r in positions[start:end]), dtype=np.intp, count=end - start)
+            cols = self._chunks[chunk_id].cols
+            for name in parts:
+                parts[name].append(cols[name][idx])
+            start = end
+        return {name: arrs[0] if len(arrs) == 1 else np.concatenate(arrs) for name, arrs in parts.items()}
+
+    def chunks(self, since: float = None):
+        """Zero-copy {column: view} per chunk, oldest first (chunks entirely before `since` skipped)."""
+        for chunk in list(self._chunks.values()):
+            view = chunk.view()
+            if not chunk.size or (since is not None and view["ts"][chunk.size - 1] < since):
+                continue
+            yield view
+
+    # -- retention -----------------------------------------------------------
+
+    def compact(self, now: float = None) -> int:
+        """Drop chunks whose newest row is older than `retention`; returns the number dropped."""
+        dropped = self._drop_expired(now)
+        self._remove_dirs(dropped)
+        return len(dropped)
+
+    def _drop_expired(self, now: float = None):
+        """Forget expired chunks in memory; returns their ids (their directories are removed by the caller)."""
+        if not self.retention:
+            return []
+        cutoff = (time.time() if now is None else now) - self.retention
+        active_id = next(reversed(self._chunks), None)
+        dropped = []
+        for chunk_id, chunk in self._chunks.items():
+            if chunk_id == active_id or (chunk.size and chunk.cols["ts"][chunk.size - 1] >= cutoff):
+                break
+            dropped.append(chunk_id)
+        for chunk_id in dropped:
+            chunk = self._chunks.pop(chunk_id)
+            self.stats["rows"] -= chunk.size
+        if dropped:
+            self.stats["chunks_dropped"] += len(dropped)
+            first = next(iter(self._chunks))
+            for h in [h for h, rows in self._index.items() if not rows or rows[-1][0] < first]:
+                del self._index[h]
+                self._backfilled.discard(h)
+        return dropped
+
+    def _remove_dirs(self, chunk_ids):
+        if not self.path:
+            return
+        for chunk_id in chunk_ids:
+            shutil.rmtree(self._chunk_dir(chunk_id), ignore_errors=True)
+
+    async def maintain(self, now: float = None):
+        """Per-cycle housekeeping: write full chunks, periodic flush of the active one, retention; I/O in a thread."""
+        if self._maintaining:
+            return
+        self._maintaining = True
+        try:
+            await self.flush_async(force=False)
+            dropped = self._drop_expired(now)
+            if dropped and self.path:
+                await asyncio.to_thread(self._remove_dirs, dropped)
+        finally:
+            self._maintaining = False
+
+
+_series = None
+
+
+def get_odds_series() -> OddsSeries:
+    global _series
+    if _series is None:
+        _series = OddsSeries()
+    return _series
@@ -0,0 +1,224 @@
+# pari_feed.py - PARI events/list JSON feed as an event source
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+
+import metrics
+from http_client import fetch_conditional
+from pari_parser import ODDS_MAX, ODDS_MIN, near_band
+
+FEED_URL = os.getenv("PARI_FEED_URL", "https://line-lb01-w.pb06e2-resources.com/events/list")
+FEED_PARAMS = {"lang": "ru", "scopeMarket": "2300"}
+FEED_EVENT_URL = os.getenv("PARI_FEED_EVENT_URL", "https://pari.ru/live/?eventId={id}")
+FEED_FULL_REFRESH = float(os.getenv("PARI_FEED_FULL_REFRESH", "300"))  # seconds between full snapshots
+
+# factor ids of the main "1 X 2" market in the feed's customFactors
+MARKET_FACTORS = {921: "1", 922: "X", 923: "2"}
+
+
+@dataclass(slots=True)
+class LiveEvent:
+    id: int
+    sport_id: int
+    team1: str
+    team2: str
+    timer: str = None
+    score: str = None
+    odds: dict = field(default_factory=dict)  # outcome ("1", "X", "2") -> decimal odds
+
+    @property
+    def teams(self) -> str:
+        return f"{self.team1} — {self.team2}"
+
+    @property
+    def link(self) -> str:
+        return FEED_EVENT_URL.format(id=self.id)
+
+    def candidates(self, odds_min: float = ODDS_MIN, odds_max: float = ODDS_MAX):
+        """One pipeline event dict per outcome priced inside the odds band."""
+        out = []
+        for outcome, value in sorted(self.odds.items()):
+            if odds_min <= value <= odds_max:
+                out.append({
+                    "id": self.id,
+                    "sport_id": self.sport_id,
+                    "team1": self.team1,
+                    "team2": self.team2,
+                    "teams": self.teams,
+                    "outcome": outcome,
+                    "odds": value,
+                    "timer": self.timer,
+                    "score": self.score,
+                    "link": self.link,
+                })
+        return out
+
+
+def market_odds(custom_factors):
+    """event id -> {outcome: odds} for the main "1 X 2" market in `customFactors`."""
+    odds_map = {}
+    for cf in custom_factors:
+        market = {}
+        for f in cf.get("factors", ()):
+            outcome = MARKET_FACTORS.get(f.get("f"))
+            if outcome and f.get("v"):
+                market[outcome] = float(f["v"])
+        if market:
+            odds_map[cf.get("e")] = market
+    return odds_map
+
+
+def build_live_events(events, live_infos, custom_factors=()):
+    """Join `events` and `liveEventInfos` by id and attach main-market odds from `customFactors`."""
+    events_map = {e["id"]: e for e in events if "id" in e}
+    odds_map = market_odds(custom_factors)
+
+    live = []
+    for info in live_infos:
+        event_id = info.get("eventId")
+        base = events_map.get(event_id)
+        if not base or not base.get("team1") or not base.get("team2"):
+            continue
+        live.append(LiveEvent(
+            id=event_id,
+            sport_id=base.get("sportId"),
+            team1=base["team1"],
+            team2=base["team2"],
+            timer=info.get("timer"),
+            score=info.get("scoreComment"),
+            odds=odds_map.get(event_id, {}),
+        ))
+    return live
+
+
+def upcoming_events(events, live_infos, custom_factors=(), now: float = None, horizon: float = 6 * 3600):
+    """Top-level pre-match events kicking off within `horizon` seconds, soonest first."""
+    now = time.time() if now is None else now
+    live_ids = {info.get("eventId") for info in live_infos}
+    odds_map = market_odds(custom_factors)
+    out = []
+    for e in events:
+        start = e.get("startTime")
+        if (e.get("id") in live_ids or e.get("parentId") or not e.get("team1") or not e.get("team2")
+                or not start or not now < start <= now + horizon):
+            continue
+        out.append({
+            "id": e["id"],
+            "sport_id": e.get("sportId"),
+            "team1": e["team1"],
+            "team2": e["team2"],
+            "start_time": start,
+            "odds": odds_map.get(e["id"], {}),
+        })
+    out.sort(key=lambda ev: ev["start_time"])
+    return out
+
+
+class PariFeed:
+    """
+    Incremental reader of the events/list feed.
+    Uses the feed's `version` parameter to receive deltas and ETag/Last-Modified
+    validators so an unchanged feed costs a 304; a full snapshot is taken every
+    FEED_FULL_REFRESH seconds to drop events that ended.
+    """
+
+    def __init__(self, url: str = FEED_URL, params: dict = None):
+        self.url = url
+        self.params = dict(FEED_PARAMS if params is None else params)
+        self.version = None
+        self.validators = {}
+        self._events = {}
+        self._infos = {}
+        self._factors = {}
+        self._last_full = 0.0
+        self._live = []
+        self.stats = {"requests": 0, "not_modified": 0, "deltas": 0, "full": 0, "bytes": 0}
+
+    def _apply(self, data: dict, delta: bool):
+        if not delta:
+            self._events.clear()
+            self._infos.clear()
+            self._factors.clear()
+        for e in data.get("events", ()):
+            if "id" in e:
+                self._events[e["id"]] = {**self._events.get(e["id"], {}), **e}
+        for info in data.get("liveEventInfos", ()):
+            if "eventId" in info:
+                self._infos[info["eventId"]] = info
+        for cf in data.get("customFactors", ()):
+            eid = cf.get("e")
+            if eid is None:
+                continue
+            merged = {f.get("f"): f for f in self._factors.get(eid, {}).get("factors", ())}
+            merged.update({f.get("f"): f for f in cf.get("factors", ())})
+            self._factors[eid] = {"e": eid, "factors": list(merged.values())}
+        self._live = build_live_events(self._events.values(), self._infos.values(), self._factors.values())
+
+    def near_band(self) -> int:
+        """Live outcomes from the last poll priced just outside the odds band (see pari_parser.near_band)."""
+        return sum(1 for ev in self._live for value in ev.odds.values() if near_band(value))
+
+    def upcoming(self, horizon: float = 6 * 3600, now: float = None):
+        """Pre-match events from the last poll (see upcoming_events)."""
+        return upcoming_events(self._events.values(), self._infos.values(), self._factors.values(), now, horizon)
+
+    def snapshot(self) -> dict:
+        """Merged feed state in the events/list shape (recorded for replay by cycle_recorder)."""
+        return {
+            "packetVersion": self.version,
+            "events": list(self._events.values()),
+            "liveEventInfos": list(self._infos.values()),
+            "customFactors": list(self._factors.values()),
+        }
+
+    async def poll(self):
+        """Return the current list of LiveEvent, fetching only what changed since the last poll."""
+        now = time.monotonic()
+        full = self.version is None or now - self._last_full >= FEED_FULL_REFRESH
+        params = dict(self.params)
+        if not full:
+            params["version"] = self.version
+        self.stats["requests"] += 1
+        status, body, validators = await fetch_conditional(
+            self.url,
+            etag=None if full else self.validators.get("etag"),
+            last_modified=None if full else self.validators.get("last_modified"),
+            params=params,
+        )
+        if status == 304:
+            self.stats["not_modified"] += 1
+            return self._live
+        if status != 200:
+            raise RuntimeError(f"PARI feed returned HTTP {status}")
+        self.validators = validators
+        self.stats["bytes"] += len(body)
+        with metrics.STAGE_SECONDS.time(stage="parse"):
+            data = await asyncio.get_running_loop().run_in_executor(None, json.loads, body)
+
+        delta = not full and data.get("fromVersion") == self.version
+        self._apply(data, delta)
+        self.stats["deltas" if delta else "full"] += 1
+        if not delta:
+            self._last_full = now
+        self.version = data.get("packetVersion", self.version)
+        return self._live
+
+
+_feed = None
+
+
+def get_feed() -> PariFeed:
+    global _feed
+    if _feed is None:
+        _feed = PariFeed()
+    return _feed
+
+
+async def fetch_feed_events():
+    """Pipeline events (one per in-band outcome) from the JSON feed."""
+    events = []
+    for ev in await get_feed().poll():
+        events.extend(ev.candidates())
+    return events
@@ -0,0 +1,144 @@
+# pari_live.py - PARI live page over a keep-alive session: conditional GETs and a streamed parse
+import os
+import time
+
+import aiohttp
+
+import metrics
+from http_client import new_http_session, timing_trace_config
+from pari_parser import (PARI_LIVE_URL, PARSE_EXECUTOR, PARSER_ENGINE, StreamingParser, near_band, near_band_bounds,
+                         parse_events_from_html, submit_stream_step)
+
+LIVE_STREAM_PARSE = os.getenv("LIVE_STREAM_PARSE", "1")  # "0": download fully, then parse in the executor (also with PARSE_EXECUTOR=process)
+LIVE_TIMEOUT = float(os.getenv("LIVE_TIMEOUT", "20"))
+LIVE_CHUNK = 64 * 1024
+
+HTTP_PHASE_SECONDS = metrics.Histogram("betfetcher_http_phase_seconds", "Live page request phases.", ("phase",))
+HTTP_BYTES = metrics.Counter("betfetcher_http_bytes_total", "Live page body bytes (decoded) and wire bytes (Content-Length).", ("kind",))
+LIVE_RESPONSES = metrics.Counter("betfetcher_live_responses_total", "Live page responses by status.", ("status",))
+
+
+class PariLivePage:
+    """
+    The live page through one long-lived session (pooled connections, cached DNS,
+    br/gzip). ETag/Last-Modified validators turn an unchanged page into a 304 that
+    reuses the previous events without parsing; a changed page is parsed chunk by
+    chunk while it downloads (parser engine "fast") on the parse thread, so the
+    event loop only moves bytes. The page is parsed with the band widened by
+    NEAR_BAND_MARGIN: `events` keeps the in-band outcomes, `near_band` counts the rest.
+    """
+
+    def __init__(self, url: str = None, stream_parse: bool = None, keep_html: bool = False):
+        self.url = url or PARI_LIVE_URL
+        self.stream_parse = LIVE_STREAM_PARSE == "1" if stream_parse is None else stream_parse
+        self.keep_html = keep_html
+        self.validators = {}
+        self.events = []
+        self.near_band = 0
+        self.html = None
+        self.last_status = None
+        self._session = None
+        self.stats = {"requests": 0, "not_modified": 0, "bytes": 0, "wire_bytes": 0, "connections": 0,
+                      "reused": 0, "dns_seconds": 0.0, "connect_seconds": 0.0, "ttfb_seconds": 0.0,
+                      "transfer_seconds": 0.0}
+
+    def _observe(self, phase: str, seconds: float):
+        if phase == "reused":
+            self.stats["reused"] += 1
+            return
+        if phase == "connect":
+            self.stats["connections"] += 1
+        self.stats[f"{phase}_seconds"] += seconds
+        HTTP_PHASE_SECONDS.observe(seconds, phase=phase)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = new_http_session(timeout=LIVE_TIMEOUT, trace_configs=[timing_trace_config(self._observe)])
+        return self._session
+
+    async def close(self):
+        session, self._session = self._session, None
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def _read(self, resp):
+        """
+        Body -> events; streamed into the parser as chunks arrive unless disabled.
+        The parser works on chunk N while chunk N+1 downloads.
+        """
+        stream = self.stream_parse and PARSER_ENGINE == "fast" and PARSE_EXECUTOR != "process"
+        band = near_band_bounds()
+        parser = StreamingParser(resp.charset, *band) if stream else None
+        chunks = [] if (self.keep_html or not stream) else None
+        size = 0
+        pending = None
+        try:
+            async for chunk in resp.content.iter_chunked(LIVE_CHUNK):
+                size += len(chunk)
+                if parser is not None:
+                    if pending is not None:
+                        await pending
+                    pending = submit_stream_step(parser.feed, chunk)
+                if chunks is not None:
+                    chunks.append(chunk)
+            if pending is not None:
+                await pending
+                pending = None
+        finally:
+            if pending is not None:
+                pending.cancel()
+        html = b"".join(chunks).decode(resp.charset or "utf-8", "replace") if chunks is not None else None
+        if parser is not None:
+            events = await submit_stream_step(parser.close)
+            metrics.STAGE_SECONDS.observe(parser.seconds, stage="parse")
+        else:
+            with metrics.STAGE_SECONDS.time(stage="parse"):
+                events = await parse_events_from_html(html, None, *band)
+        return size, html, events
+
+    async def fetch(self):
+        """Current live events; the previous list on 304 (check `last_status`)."""
+        headers = {}
+        if self.validators.get("etag"):
+            headers["If-None-Match"] = self.validators["etag"]
+        if self.validators.get("last_modified"):
+            headers["If-Modified-Since"] = self.validators["last_modified"]
+        self.stats["requests"] += 1
+        async with self._get_session().get(self.url, headers=headers) as resp:
+            self.last_status = resp.status
+            LIVE_RESPONSES.inc(status=str(resp.status))
+            if resp.status == 304:
+                self.stats["not_modified"] += 1
+                return self.events
+            resp.raise_for_status()
+            t0 = time.perf_counter()
+            size, html, events = await self._read(resp)
+            transfer = time.perf_counter() - t0
+        self._observe("transfer", transfer)
+        self.stats["bytes"] += size
+        HTTP_BYTES.inc(size, kind="body")
+        if resp.content_length:
+            self.stats["wire_bytes"] += resp.content_length
+            HTTP_BYTES.inc(resp.content_length, kind="wire")
+        self.validators = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+        self.events = [ev for ev in events if not near_band(ev["odds"])]
+        self.near_band = len(events) - len(self.events)
+        self.html = html if self.keep_html else None
+        return self.events
+
+
+_live_page = None
+
+
+def get_live_page() -> PariLivePage:
+    global _live_page
+    if _live_page is None:
+        _live_page = PariLivePage()
+    return _live_page
+
+
+async def close_live_page():
+    global _live_page
+    page, _live_page = _live_page, None
+    if page is not None:
+        await page.close()
@@ -0,0 +1,403 @@
+# pari_parser.py - PARI live page parsers (legacy BeautifulSoup + single-pass engine)
+import asyncio
+import codecs
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree as _etree
+    from lxml import html as _lxml_html
+except ImportError:
+    _etree = None
+    _lxml_html = None
+
+PARI_BASE_URL = "https://pari.ru"
+PARI_LIVE_URL = os.getenv("PARI_LIVE_URL", "https://pari.ru/live/")
+ODDS_MIN = 1.05
+ODDS_MAX = 1.33
+NEAR_BAND_MARGIN = float(os.getenv("NEAR_BAND_MARGIN", "0.1"))  # prices this far outside the band count as near it
+
+PARSER_ENGINE = os.getenv("PARSER_ENGINE", "fast")  # fast | legacy | compare
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "auto")  # auto | lxml | stdlib
+PARSE_EXECUTOR = os.getenv("PARSE_EXECUTOR", "thread")  # thread | process | inline
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))
+
+BLOCK_CLASS = "sport-base-event"
+CAPTION_CLASSES = frozenset((
+    "sport-base-event__main__caption--JLR1n",
+    "sport-sub-event__name--J7jv6",
+    "table-component-text--Tjj3g",
+    "team-names",
+    "team-name",
+))
+CAPTION_SELECTOR = ", ".join("." + c for c in sorted(CAPTION_CLASSES))
+NUMERIC_TAGS = frozenset(("span", "div"))
+VOID_TAGS = frozenset(("area", "base", "br", "col", "embed", "hr", "img", "input",
+                       "link", "meta", "param", "source", "track", "wbr"))
+FALLBACK_TITLE_LEN = 140
+
+_NON_NUMERIC = re.compile(r'[^0-9,\\.]')
+
+
+def extract_number(s: str):
+    try:
+        if not s:
+            return None
+        txt = _NON_NUMERIC.sub('', s)
+        if not txt:
+            return None
+        return float(txt.replace(',', '.'))
+    except Exception:
+        return None
+
+
+def _absolute(link):
+    if not link:
+        return PARI_LIVE_URL
+    if link.startswith("/"):
+        return PARI_BASE_URL + link
+    return link
+
+
+def _band(odds_min=None, odds_max=None):
+    """(odds_min, odds_max) with unset bounds taken from ODDS_MIN/ODDS_MAX at call time."""
+    return (ODDS_MIN if odds_min is None else odds_min), (ODDS_MAX if odds_max is None else odds_max)
+
+
+def near_band(odds: float, margin: float = None) -> bool:
+    """Priced outside the band but within `margin` of it (the next move may bring it in)."""
+    margin = NEAR_BAND_MARGIN if margin is None else margin
+    return ODDS_MIN - margin <= odds < ODDS_MIN or ODDS_MAX < odds <= ODDS_MAX + margin
+
+
+def near_band_bounds(margin: float = None):
+    """The band widened by `margin` on both sides: parse with it, then split with near_band()."""
+    margin = NEAR_BAND_MARGIN if margin is None else margin
+    return ODDS_MIN - margin, ODDS_MAX + margin
+
+
+def _block_events(teams, odds, link, odds_min, odds_max):
+    link = _absolute(link)
+    return [{"teams": teams, "odds": o, "link": link}
+            for o in sorted(set(odds)) if odds_min <= o <= odds_max]
+
+
+# --- legacy engine -------------------------------------------------------
+
+def parse_events_legacy(html: str, odds_min: float = None, odds_max: float = None):
+    """The original BeautifulSoup/html.parser implementation, kept for comparison."""
+    from bs4 import BeautifulSoup
+
+    odds_min, odds_max = _band(odds_min, odds_max)
+    soup = BeautifulSoup(html, "html.parser")
+    events = []
+    # Find event blocks by class name pattern used on pari.ru
+    for block in soup.find_all("div", class_=lambda c: c and BLOCK_CLASS in c):
+        try:
+            teams = None
+            sel = block.select_one(CAPTION_SELECTOR)
+            if sel:
+                teams = sel.get_text(" ", strip=True)
+            if not teams:
+                teams = block.get_text(" ", strip=True)[:FALLBACK_TITLE_LEN]
+
+            odds = []
+            for span in block.find_all(["span", "div"]):
+                num = extract_number(span.get_text(strip=True))
+                if num:
+                    odds.append(num)
+
+            link_el = block.select_one("a[href]")
+            link = link_el["href"] if link_el and link_el.get("href") else None
+            events.extend(_block_events(teams, odds, link, odds_min, odds_max))
+        except Exception:
+            continue
+    return events
+
+
+# --- single-pass engine ----------------------------------------------------
+# Only the outermost "sport-base-event" div is a block; every text node is
+# visited once and numbers are read from text directly inside span/div.
+
+class _BlockWalker(HTMLParser):
+    def __init__(self, odds_min: float, odds_max: float):
+        super().__init__(convert_charrefs=True)
+        self.odds_min = odds_min
+        self.odds_max = odds_max
+        self.events = []
+        self._stack = []
+        self._block_depth = None
+        self._caption_depth = None
+        self._reset_block()
+
+    def _reset_block(self):
+        self._teams = None
+        self._caption = []
+        self._title = []
+        self._title_len = 0
+        self._odds = []
+        self._link = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        self._stack.append(tag)
+        if self._block_depth is None:
+            if tag == "div":
+                cls = dict(attrs).get("class") or ""
+                if BLOCK_CLASS in cls:
+                    self._block_depth = len(self._stack)
+                    self._reset_block()
+            return
+        if tag == "a" and self._link is None:
+            href = dict(attrs).get("href")
+            if href:
+                self._link = href
+        if self._teams is None and self._caption_depth is None:
+            cls = dict(attrs).get("class")
+            if cls and not CAPTION_CLASSES.isdisjoint(cls.split()):
+                self._caption_depth = len(self._stack)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self._stack:
+            return
+        while self._stack:
+            depth = len(self._stack)
+            if self._caption_depth == depth:
+                self._caption_depth = None
+                self._teams = " ".join(self._caption) or None
+            if self._block_depth == depth:
+                self._block_depth = None
+                self._flush_block()
+            if self._stack.pop() == tag:
+                break
+
+    def handle_data(self, data):
+        if self._block_depth is None:
+            return
+        text = data.strip()
+        if not text:
+            return
+        if self._caption_depth is not None:
+            self._caption.append(text)
+        if self._title_len < FALLBACK_TITLE_LEN:
+            self._title.append(text)
+            self._title_len += len(text) + 1
+        if self._stack[-1] in NUMERIC_TAGS:
+            num = extract_number(text)
+            if num:
+                self._odds.append(num)
+
+    def _flush_block(self):
+        teams = self._teams or " ".join(self._title)[:FALLBACK_TITLE_LEN]
+        self.events.extend(_block_events(teams, self._odds, self._link, self.odds_min, self.odds_max))
+        self._reset_block()
+
+    def close(self):
+        super().close()
+        if self._block_depth is not None:
+            self._block_depth = None
+            self._flush_block()
+
+
+def _parse_stdlib(html: str, odds_min: float, odds_max: float):
+    walker = _BlockWalker(odds_min, odds_max)
+    walker.feed(html)
+    walker.close()
+    return walker.events
+
+
+if _etree is not None:
+    _BLOCKS_XPATH = _etree.XPath(
+        f"//div[contains(@class, '{BLOCK_CLASS}')]"
+        f"[not(ancestor::div[contains(@class, '{BLOCK_CLASS}')])]"
+    )
+
+
+def _parse_lxml(html: str, odds_min: float, odds_max: float):
+    return _events_from_lxml(_lxml_html.fromstring(html), odds_min, odds_max)
+
+
+def _events_from_lxml(root, odds_min: float, odds_max: float):
+    events = []
+    for block in _BLOCKS_XPATH(root):
+        teams = None
+        title = []
+        title_len = 0
+        odds = []
+        link = None
+        for el in block.iter():
+            tag = el.tag
+            if not isinstance(tag, str):
+                continue
+            if tag == "a" and link is None:
+                link = el.get("href") or None
+            if teams is None:
+                cls = el.get("class")
+                if cls and not CAPTION_CLASSES.isdisjoint(cls.split()):
+                    teams = " ".join(t.strip() for t in el.itertext() if t.strip()) or None
+            for text, container in ((el.text, tag), (el.tail if el is not block else None, None)):
+                if not text:
+                    continue
+                text = text.strip()
+                if not text:
+                    continue
+                if title_len < FALLBACK_TITLE_LEN:
+                    title.append(text)
+                    title_len += len(text) + 1
+                if container is None:
+                    parent = el.getparent()
+                    container = parent.tag if parent is not None else None
+                if container in NUMERIC_TAGS:
+                    num = extract_number(text)
+                    if num:
+                        odds.append(num)
+        teams = teams or " ".join(title)[:FALLBACK_TITLE_LEN]
+        events.extend(_block_events(teams, odds, link, odds_min, odds_max))
+    return events
+
+
+def parse_events_fast(html: str, odds_min: float = None, odds_max: float = None):
+    """
+    Single pass over each event block; lxml backend when installed, stdlib HTMLParser otherwise.
+    Outcomes priced within [odds_min, odds_max] become events (default: ODDS_MIN/ODDS_MAX).
+    """
+    if not html:
+        return []
+    odds_min, odds_max = _band(odds_min, odds_max)
+    use_lxml = PARSER_BACKEND == "lxml" or (PARSER_BACKEND == "auto" and _etree is not None)
+    if use_lxml and _etree is not None:
+        return _parse_lxml(html, odds_min, odds_max)
+    return _parse_stdlib(html, odds_min, odds_max)
+
+
+class StreamingParser:
+    """
+    parse_events_fast over a body that arrives in chunks: feed() bytes as they are
+    downloaded, close() returns the events. lxml builds its tree incrementally,
+    the stdlib walker emits blocks as soon as they end. `seconds` adds up the time
+    spent inside feed()/close(), i.e. parsing without the download in between.
+    """
+
+    def __init__(self, encoding: str = None, odds_min: float = None, odds_max: float = None):
+        self.odds_min, self.odds_max = _band(odds_min, odds_max)
+        use_lxml = PARSER_BACKEND == "lxml" or (PARSER_BACKEND == "auto" and _etree is not None)
+        self._lxml = _lxml_html.HTMLParser(encoding=encoding) if use_lxml and _etree is not None else None
+        if self._lxml is None:
+            self._walker = _BlockWalker(self.odds_min, self.odds_max)
+            self._decoder = codecs.getincrementaldecoder(encoding or "utf-8")("replace")
+        self.size = 0
+        self.seconds = 0.0
+
+    def feed(self, chunk: bytes):
+        t0 = time.perf_counter()
+        self.size += len(chunk)
+        if self._lxml is not None:
+            self._lxml.feed(chunk)
+        else:
+            self._walker.feed(self._decoder.decode(chunk))
+        self.seconds += time.perf_counter() - t0
+
+    def close(self):
+        t0 = time.perf_counter()
+        try:
+            if self._lxml is not None:
+                if not self.size:
+                    return []
+                return _events_from_lxml(self._lxml.close(), self.odds_min, self.odds_max)
+            self._walker.feed(self._decoder.decode(b"", final=True))
+            self._walker.close()
+            return self._walker.events
+        finally:
+            self.seconds += time.perf_counter() - t0
+
+
+def compare_parsers(html: str, odds_min: float = None, odds_max: float = None):
+    """Run both engines; returns (legacy, fast, only_in_legacy, only_in_fast)."""
+    legacy = parse_events_legacy(html, odds_min, odds_max)
+    fast = parse_events_fast(html, odds_min, odds_max)
+    key = lambda e: (e["teams"], e["odds"], e["link"])
+    a = {key(e) for e in legacy}
+    b = {key(e) for e in fast}
+    return legacy, fast, sorted(a - b), sorted(b - a)
+
+
+def _parse_with_engine(html: str, engine: str, odds_min: float = None, odds_max: float = None):
+    if engine == "legacy":
+        return parse_events_legacy(html, odds_min, odds_max)
+    if engine == "compare":
+        legacy, fast, only_legacy, only_fast = compare_parsers(html, odds_min, odds_max)
+        print(f"🔬 Parser compare: legacy={len(legacy)} fast={len(fast)} "
+              f"only_legacy={len(only_legacy)} only_fast={len(only_fast)}")
+        for e in only_legacy[:5]:
+            print("   - legacy only:", e)
+        for e in only_fast[:5]:
+            print("   + fast only:", e)
+        return legacy
+    return parse_events_fast(html, odds_min, odds_max)
+
+
+_executor = None
+_stream_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        if PARSE_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="parse")
+    return _executor
+
+
+def _get_stream_executor():
+    # one thread: StreamingParser steps run in submission order, always on the same thread
+    global _stream_executor
+    if _stream_executor is None:
+        _stream_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream-parse")
+    return _stream_executor
+
+
+def submit_stream_step(fn, *args) -> asyncio.Future:
+    """
+    Run one StreamingParser step (feed/close) off the event loop; returns a future.
+    Inline with PARSE_EXECUTOR=inline. A parser holds state, so it cannot go to a
+    process pool: callers download fully and use parse_events_from_html there.
+    """
+    loop = asyncio.get_running_loop()
+    if PARSE_EXECUTOR != "inline":
+        return loop.run_in_executor(_get_stream_executor(), fn, *args)
+    fut = loop.create_future()
+    try:
+        fut.set_result(fn(*args))
+    except Exception as e:
+        fut.set_exception(e)
+    return fut
+
+
+def shutdown_parse_executor():
+    global _executor, _stream_executor
+    for executor in (_executor, _stream_executor):
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    _executor = _stream_executor = None
+
+
+async def parse_events_from_html(html: str, engine: str = None, odds_min: float = None, odds_max: float = None):
+    """Parse the PARI live page off the event loop using the engine selected by PARSER_ENGINE."""
+    engine = engine or PARSER_ENGINE
+    # resolved here: a process-pool worker has its own copy of the module globals
+    odds_min, odds_max = _band(odds_min, odds_max)
+    if PARSE_EXECUTOR == "inline":
+        return _parse_with_engine(html, engine, odds_min, odds_max)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), _parse_with_engine, html, engine, odds_min, odds_max)
@@ -0,0 +1,95 @@
+# scheduler.py - drift-free, load-adaptive polling cadence for fetcher_loop
+import asyncio
+import os
+import random
+
+import metrics
+
+POLL_JITTER = float(os.getenv("POLL_JITTER", "0.1"))  # +/- share of the interval
+
+# source -> (base, min, max) seconds; base None means "use update_interval"
+DEFAULT_CADENCE = {
+    "html": (None, 60, 600),
+    "feed": (30, 10, 180),
+}
+
+TICKS_SKIPPED = metrics.Counter("betfetcher_ticks_skipped_total", "Scheduler ticks skipped because a cycle overran.")
+POLL_INTERVAL = metrics.Gauge("betfetcher_poll_interval_seconds", "Current adaptive polling interval.")
+
+
+def cadence_for(source: str, update_interval: float):
+    """(base, min, max) for `source`, overridable with POLL_INTERVAL_<SOURCE>, POLL_MIN_<SOURCE>, POLL_MAX_<SOURCE>."""
+    base, lo, hi = DEFAULT_CADENCE.get(source, (None, 60, 600))
+    suffix = source.upper()
+    base = float(os.getenv(f"POLL_INTERVAL_{suffix}", base if base is not None else update_interval))
+    lo = float(os.getenv(f"POLL_MIN_{suffix}", lo))
+    hi = float(os.getenv(f"POLL_MAX_{suffix}", hi))
+    lo = min(lo, base)
+    hi = max(hi, base)
+    return base, lo, hi
+
+
+class AdaptiveScheduler:
+    """
+    Ticks sit on a fixed grid (previous deadline + interval), so cycle time does not
+    add drift; a tick that has already passed when a cycle ends is skipped rather
+    than run late. Jitter moves the wake-up, not the grid. `observe()` shortens the
+    interval while odds move, eases it toward half the base while prices sit just
+    outside the band, returns it to base while the board is stable and backs off
+    while it is empty.
+    """
+
+    def __init__(self, base: float, min_interval: float, max_interval: float, jitter: float = POLL_JITTER):
+        self.base = base
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.interval = base
+        self._deadline = None
+        self.skipped = 0
+        POLL_INTERVAL.set(self.interval)
+
+    @classmethod
+    def for_source(cls, source: str, update_interval: float):
+        return cls(*cadence_for(source, update_interval))
+
+    def observe(self, events: int, moved: int, near: int = 0):
+        """`events` in the band, `moved` of them with new odds, `near` priced just outside it."""
+        if moved > 0:
+            self.interval = max(self.min_interval, self.interval * 0.5)
+        elif near > 0:
+            self.interval += (max(self.min_interval, self.base * 0.5) - self.interval) * 0.5
+        elif events == 0:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+        else:
+            self.interval += (self.base - self.interval) * 0.5
+        POLL_INTERVAL.set(self.interval)
+        return self.interval
+
+    def anchor(self):
+        """Start the grid at the current cycle if it is not running yet; call at the top of each cycle."""
+        if self._deadline is None:
+            self._deadline = asyncio.get_running_loop().time()
+
+    def reset(self):
+        """Drop the grid so the next anchor() restarts it (after an error backoff)."""
+        self._deadline = None
+
+    def next_deadline(self, now: float) -> float:
+        if self._deadline is None:
+            self._deadline = now
+        deadline = self._deadline + self.interval
+        if deadline <= now:
+            missed = int((now - deadline) // self.interval) + 1
+            deadline += missed * self.interval
+            self.skipped += missed
+            TICKS_SKIPPED.inc(missed)
+        self._deadline = deadline
+        return deadline
+
+    async def wait_next(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        deadline = self.next_deadline(now)
+        wake = deadline + random.uniform(-self.jitter, self.jitter) * self.interval
+        await asyncio.sleep(max(0.0, wake - now))
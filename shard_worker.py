@@ -0,0 +1,346 @@
+# shard_worker.py - scoring for one partition of the event space, run as a child process of main.py
+#
+# With WORKERS > 1, main.py starts one process per shard. The supervisor fetches
+# and parses the source once per cycle, splits the events with fetcher.shard_of()
+# and sends each worker its share (and its share of the upcoming line for the H2H
+# prefetcher) over a per-worker queue. Workers score, look up H2H and keep state
+# and odds series for their events only. They share H2H results through the sqlite
+# H2H cache and hand signals to the supervisor, which owns the only Telegram Notifier.
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+import metrics
+
+H2H_SHARED_DB = os.getenv("H2H_SHARED_DB", "h2h_cache.sqlite")  # used when H2H_CACHE_DB is unset
+
+SHARD_EVENTS = metrics.Gauge("betfetcher_shard_events", "Candidate events in the last cycle of each shard.", ("shard",))
+SHARD_RESTARTS = metrics.Counter("betfetcher_shard_restarts_total", "Worker processes restarted after exiting.")
+SHARD_DROPPED = metrics.Counter("betfetcher_shard_dropped_total", "Messages dropped from a full worker inbox.")
+
+
+class QueueNotifier:
+    """Notifier for a worker process: messages go to the supervisor's queue."""
+
+    def __init__(self, out_queue, shard: int):
+        self.queue = out_queue
+        self.shard = shard
+        self.stats = {"queued": 0}
+
+    async def notify(self, text: str):
+        self.queue.put(("notify", self.shard, text))
+        self.stats["queued"] += 1
+
+    async def close(self, timeout: float = None):
+        pass
+
+
+def configure_shard_env(shard: int):
+    """Environment read by module constants; must run before fetcher and friends are imported."""
+    os.environ.setdefault("H2H_CACHE_DB", H2H_SHARED_DB)
+    series_dir = os.getenv("ODDS_SERIES_DIR", "odds_series")
+    if series_dir:
+        os.environ["ODDS_SERIES_DIR"] = os.path.join(series_dir, f"shard-{shard}")
+    os.environ["CYCLE_RECORD_DIR"] = ""  # the supervisor records the raw input
+
+
+def run(shard: int, inbox, out_queue):
+    """Process entry point."""
+    configure_shard_env(shard)
+    try:
+        asyncio.run(_serve(shard, inbox, out_queue))
+    except KeyboardInterrupt:
+        pass
+
+
+def _drain(inbox, first):
+    """The newest "events" and "upcoming" payloads among `first` and whatever else is queued."""
+    latest = {}
+    msg = first
+    while True:
+        kind, payload = msg
+        latest[kind] = payload
+        try:
+            msg = inbox.get_nowait()
+        except queue.Empty:
+            return latest
+
+
+async def _consume(shard: int, inbox, out_queue, notifier, upcoming: dict):
+    """Score every batch of events the supervisor sends; older batches still queued are skipped."""
+    from fetcher import analyze_cycle, last_cycle
+    from match_predictor import cache_stats
+
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            first = await loop.run_in_executor(None, inbox.get, True, 1.0)
+        except queue.Empty:
+            continue
+        latest = _drain(inbox, first)
+        if "upcoming" in latest:
+            upcoming["events"] = latest["upcoming"]
+        if "events" not in latest:
+            continue
+        seq, events = latest["events"]
+        started = loop.time()
+        try:
+            await analyze_cycle(notifier, events)
+        except Exception as e:
+            print(f"⚠️ Shard {shard} cycle failed: {e}", flush=True)
+            out_queue.put(("error", shard, {"seq": seq, "error": str(e), "metrics": metrics.take_deltas()}))
+            continue
+        out_queue.put(("cycle", shard, dict(last_cycle, seq=seq, seconds=loop.time() - started, h2h=cache_stats(),
+                                            metrics=metrics.take_deltas())))
+
+
+async def _serve(shard: int, inbox, out_queue):
+    from browser_pool import shutdown_browser_pool
+    from h2h_prefetch import H2HPrefetcher, prefetch_enabled
+    from http_client import close_http_session
+    from match_predictor import h2h_cache
+    from odds_store import get_odds_series
+    from pari_parser import shutdown_parse_executor
+    from team_resolver import get_resolver
+
+    print(f"🧩 Shard {shard} started (pid {os.getpid()})", flush=True)
+    notifier = QueueNotifier(out_queue, shard)
+    upcoming = {"events": []}
+    tasks = [asyncio.create_task(_consume(shard, inbox, out_queue, notifier, upcoming))]
+    if prefetch_enabled():
+        # the line comes from the supervisor; lookups stay here so they yield to this worker's live ones
+        tasks.append(asyncio.create_task(H2HPrefetcher(source=lambda: upcoming["events"]).run()))
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+    stopper = asyncio.create_task(stop.wait())
+    await asyncio.wait({*tasks, stopper}, return_when=asyncio.FIRST_COMPLETED)
+    for t in (*tasks, stopper):
+        t.cancel()
+        try:
+            await t
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Shard {shard} loop ended with: {e}", flush=True)
+
+    await shutdown_browser_pool()
+    await close_http_session()
+    shutdown_parse_executor()
+    h2h_cache.close()
+    get_odds_series().close()
+    get_resolver().save()
+
+
+class ShardSupervisor:
+    """
+    Starts the worker processes and restarts ones that die, fetches the source once
+    per cycle and fans the events out (distribute), and forwards the workers' messages.
+    A cycle counts as done once every shard has scored its batch or a newer one; the
+    workers' counters and histograms are merged into this process's metrics.
+    """
+
+    def __init__(self, shards: int, update_interval: int, inbox_size: int = 2):
+        self.shards = shards
+        self.update_interval = update_interval
+        self._ctx = multiprocessing.get_context("spawn")
+        self.queue = self._ctx.Queue()
+        self.inboxes = {shard: self._ctx.Queue(inbox_size) for shard in range(shards)}
+        self.processes = {}
+        self.dropped = 0
+        self.restarts = 0
+        self.cycles = {}  # shard -> summary of its last cycle (with "at": when it arrived, "h2h": cache stats)
+        self.seq = 0
+        self._batches = {}  # seq -> {"started", "waiting": shards yet to report, "ok"}; oldest first
+
+    def _spawn(self, shard: int):
+        proc = self._ctx.Process(target=run, args=(shard, self.inboxes[shard], self.queue),
+                                 name=f"shard-{shard}", daemon=True)
+        proc.start()
+        self.processes[shard] = proc
+
+    def start(self):
+        os.environ.setdefault("H2H_CACHE_DB", H2H_SHARED_DB)
+        for shard in range(self.shards):
+            self._spawn(shard)
+
+    async def watch(self, interval: float = 5.0):
+        """Restart workers that exited on their own."""
+        while True:
+            await asyncio.sleep(interval)
+            for shard, proc in list(self.processes.items()):
+                if not proc.is_alive():
+                    print(f"⚠️ Shard {shard} exited with code {proc.exitcode}, restarting", flush=True)
+                    self.restarts += 1
+                    SHARD_RESTARTS.inc()
+                    self._spawn(shard)
+
+    def send(self, shard: int, kind: str, payload):
+        """Queue a message for one worker; a full inbox loses its oldest message (the worker is behind)."""
+        inbox = self.inboxes[shard]
+        while True:
+            try:
+                inbox.put_nowait((kind, payload))
+                return
+            except queue.Full:
+                try:
+                    inbox.get_nowait()
+                    self.dropped += 1
+                    SHARD_DROPPED.inc()
+                except queue.Empty:
+                    pass
+
+    def fan_out(self, kind: str, events, seq: int = None):
+        """Send each worker its partition of `events`; with `seq`, as (seq, part) so its cycle can be matched."""
+        from fetcher import partition_events
+        for shard, part in enumerate(partition_events(events, self.shards)):
+            self.send(shard, kind, part if seq is None else (seq, part))
+
+    def _open_batch(self, started: float) -> int:
+        self.seq += 1
+        self._batches[self.seq] = {"started": started, "waiting": set(range(self.shards)), "ok": True}
+        return self.seq
+
+    def _settle(self, shard: int, seq: int, ok: bool) -> int:
+        """
+        Record that `shard` finished batch `seq` (older batches it skipped count as done too) and
+        count the batches this completes: one CYCLES sample each. Returns how many completed cleanly.
+        """
+        completed = 0
+        for batch_seq in [s for s in self._batches if s <= seq]:
+            batch = self._batches[batch_seq]
+            batch["waiting"].discard(shard)
+            if batch_seq == seq and not ok:
+                batch["ok"] = False
+            if batch["waiting"]:
+                continue
+            del self._batches[batch_seq]
+            if not batch["ok"]:
+                metrics.CYCLES.inc(status="error")
+                continue
+            elapsed = time.monotonic() - batch["started"]
+            metrics.CYCLE_SECONDS.observe(elapsed)
+            metrics.CYCLES.inc(status="ok")
+            if elapsed > self.update_interval:
+                metrics.CYCLE_OVERRUNS.inc()
+            completed += 1
+        if completed:
+            metrics.mark_cycle_success()
+        return completed
+
+    async def _send_upcoming(self, poll: bool):
+        from h2h_prefetch import PREFETCH_HORIZON, PREFETCH_INTERVAL
+        from pari_feed import get_feed
+        feed = get_feed()
+        while True:
+            try:
+                if poll or feed.version is None:
+                    await feed.poll()
+                self.fan_out("upcoming", feed.upcoming(PREFETCH_HORIZON))
+            except Exception as e:
+                print(f"⚠️ Upcoming line not read: {e}", flush=True)
+            await asyncio.sleep(PREFETCH_INTERVAL)
+
+    async def distribute(self, on_error=None):
+        """
+        Fetch and parse the source on the adaptive schedule and send each worker its
+        events. `on_error(exc)` is awaited when a fetch fails.
+        """
+        from fetcher import EVENT_SOURCE, collect_events, near_band_count
+        from h2h_prefetch import prefetch_enabled
+        from pari_live import PariLivePage
+        from scheduler import AdaptiveScheduler
+
+        scheduler = AdaptiveScheduler.for_source(EVENT_SOURCE, self.update_interval)
+        live_page = PariLivePage()
+        upcoming_task = asyncio.create_task(self._send_upcoming(EVENT_SOURCE != "feed")) if prefetch_enabled() else None
+        backoff = 5
+        try:
+            while True:
+                try:
+                    scheduler.anchor()
+                    started = time.monotonic()
+                    events = await collect_events(live_page=live_page)
+                    self.fan_out("events", events, seq=self._open_batch(started))
+                    backoff = 5
+                    moved = sum(c.get("moved", 0) for c in self.cycles.values())
+                    scheduler.observe(len(events), moved, near_band_count(EVENT_SOURCE, live_page))
+                    await scheduler.wait_next()
+                except Exception as e:
+                    print(f"⚠️ Shard fetch failed: {e}", flush=True)
+                    metrics.CYCLES.inc(status="error")
+                    if on_error is not None:
+                        await on_error(e)
+                    scheduler.reset()
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 300)
+        finally:
+            if upcoming_task is not None:
+                upcoming_task.cancel()
+            await live_page.close()
+
+    async def forward(self, on_notify, on_cycle):
+        """Drain the worker queue: await on_notify(text) for messages, call on_cycle(totals()) per finished cycle."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                kind, shard, payload = await loop.run_in_executor(None, self.queue.get, True, 1.0)
+            except queue.Empty:
+                continue
+            if kind == "notify":
+                await on_notify(payload)
+                continue
+            metrics.merge_deltas(payload.pop("metrics", {}))
+            if kind == "cycle":
+                self.cycles[shard] = payload = dict(payload, at=time.time())
+                SHARD_EVENTS.set(payload.get("events", 0), shard=str(shard))
+                if self._settle(shard, payload["seq"], ok=True):
+                    totals = self.totals()
+                    metrics.LAST_CYCLE_EVENTS.set(totals["events"])
+                    on_cycle(totals)
+            elif kind == "error":
+                self._settle(shard, payload["seq"], ok=False)
+
+    def totals(self) -> dict:
+        """Last-cycle events/signals summed over shards, H2H cache hits/lookups and the newest cycle time."""
+        out = {"at": None, "events": 0, "signals": 0, "cache_hits": 0, "cache_lookups": 0}
+        for summary in self.cycles.values():
+            out["at"] = max(out["at"] or 0.0, summary["at"])
+            out["events"] += summary.get("events", 0)
+            out["signals"] += summary.get("signals", 0)
+            h2h = summary.get("h2h") or {}
+            hits = h2h.get("hits", 0) + h2h.get("negative_hits", 0) + h2h.get("stale_hits", 0)
+            out["cache_hits"] += hits
+            out["cache_lookups"] += hits + h2h.get("misses", 0) + h2h.get("coalesced", 0)
+        return out
+
+    def h2h_stats(self) -> dict:
+        """The workers' latest H2H cache stats summed over shards, with the combined hit ratio."""
+        out = {}
+        for summary in self.cycles.values():
+            for key, v in (summary.get("h2h") or {}).items():
+                if key != "hit_ratio" and isinstance(v, (int, float)) and not isinstance(v, bool):
+                    out[key] = out.get(key, 0) + v
+        totals = self.totals()
+        out["hit_ratio"] = totals["cache_hits"] / totals["cache_lookups"] if totals["cache_lookups"] else 0.0
+        return out
+
+    def stop(self, timeout: float = 20.0):
+        for proc in self.processes.values():
+            if proc.is_alive():
+                proc.terminate()  # SIGTERM: the worker closes its clients and caches
+        for proc in self.processes.values():
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.kill()
+        self.queue.close()
+        for inbox in self.inboxes.values():
+            inbox.close()
@@ -1,120 +1,255 @@
 import asyncio
+import os
 import re
 import json
+import time
 import traceback
-from bs4 import BeautifulSoup
 
-try:
-    from playwright.async_api import async_playwright
-except ImportError:
-    async_playwright = None
-
-import requests
+from browser_pool import get_browser_pool, shutdown_browser_pool
+from feed_capture import capture_feed
+from http_client import fetch_text, close_http_session
+import metrics
+from flashscore_feed import H2H_SECTION_MARK, has_sections, is_feed, iter_records, parse_h2h
+from team_resolver import get_resolver, normalize
 
 DEBUG = True
+FLASHSCORE_FEED_URL = os.getenv("FLASHSCORE_FEED_URL", "https://d.flashscore.com/x/feed/")
+FLASHSCORE_FSIGN = os.getenv("FLASHSCORE_FSIGN", "SW9D1eZo")
+FLASHSCORE_MATCH_URL = "https://www.flashscore.com/match/{match_id}/"
+FLASHSCORE_SPORTS = [x for x in os.getenv("FLASHSCORE_SPORTS", "1,2,3,4").split(",") if x]
+FLASHSCORE_LIST_FEED = os.getenv("FLASHSCORE_LIST_FEED", "f_{sport}_0_3_en_1")  # today's matches per sport
+H2H_FEED_MARKER = "/x/feed/h2h_"
+DIRECTORY_TTL = float(os.getenv("FLASHSCORE_DIRECTORY_TTL", "600"))
+H2H_BROWSER_FALLBACK = os.getenv("H2H_BROWSER_FALLBACK", "1")  # "0": только фид, без браузера
+
+# поля фида списка матчей
+L_MATCH_ID = "AA"
+L_HOME = "AE"
+L_AWAY = "AF"
+L_HOME_ID = "PX"
+L_AWAY_ID = "PY"
+
+_directory = {}  # frozenset((participant_id, participant_id)) -> flashscore match id
+_directory_at = 0.0
+_directory_task = None  # фоновое обновление справочника
+
+
+def _soup(html: str):
+    # bs4 нужен только запасным путям, не тянем его при старте
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, "html.parser")
+
+
+def h2h_page_url(url: str) -> str:
+    """Страница матча -> вкладка H2H (она сама запрашивает фид h2h_)."""
+    if "h2h" in url:
+        return url
+    return url.split("#", 1)[0] + "#/h2h/overall"
 
 
 async def fetch_h2h(url: str, team1: str = None, team2: str = None, limit: int = 5):
     print(f"🌐 fetch_h2h: {url} (team1={team1}, team2={team2})")
 
     # Попробуем сначала API Flashscore
+    t0 = time.perf_counter()
     api_result = await fetch_h2h_via_api(url, team1, team2, limit)
-    if api_result:
-        print("✅ Найдено через API Flashscore")
+    result = "error" if api_result is None else ("ok" if api_result else "empty")
+    metrics.H2H_SECONDS.observe(time.perf_counter() - t0, source="api", result=result)
+    if api_result is not None:
+        print(f"✅ API Flashscore ответил: {len(api_result)} матчей")
         return api_result
+    return await fetch_h2h_browser(url, team1, team2, limit)
 
-    # Если API не сработал — используем Playwright
-    if async_playwright:
+
+async def fetch_h2h_browser(url: str, team1: str = None, team2: str = None, limit: int = 5):
+    """H2H без API: перехват фида в общем пуле Playwright, затем обычный HTTP-запрос страницы."""
+    pool = get_browser_pool()
+    if pool.available:
+        t0 = time.perf_counter()
         try:
-            async with async_playwright() as p:
-                print("🚀 Launching Chromium...")
-                browser = await p.chromium.launch(headless=True, args=["--no-sandbox"])
-                page = await browser.new_page()
-
-                await page.goto(url, timeout=60000)
-                print("✅ Страница загружена")
-
-                # Кликаем по H2H, если нужно
-                try:
-                    await page.click("a:has-text('H2H')")
-                    print("🟢 Открыта вкладка H2H")
-                    await asyncio.sleep(3)
-                except Exception:
-                    pass
-
-                await asyncio.sleep(3)
-                html = await page.content()
-                soup = BeautifulSoup(html, "html.parser")
+            html = None
+            async with pool.page() as page:
+                # Ждём сам XHR-фид h2h_, а не фиксированные паузы; картинки/шрифты/CSS/реклама блокируются
+                body = await capture_feed(page, h2h_page_url(url), H2H_FEED_MARKER)
+                if body is None:
+                    html = await page.content()
 
+            if body is not None and is_feed(body):
+                print("✅ Фид H2H перехвачен")
+                matches = h2h_results_from_feed(body, limit)
+            else:
+                # Фид не пришёл — разбираем то, что успело отрисоваться
+                print("⚠️ Фид не перехвачен, разбираем DOM")
+                soup = _soup(html or "")
                 matches = extract_matches_from_html(soup, team1, team2, limit)
 
-                if not matches:
-                    print("⚠️ Данных в DOM нет, пробуем fallback")
-                    scripts = soup.find_all("script")
-                    for s in scripts:
-                        if "h2h" in s.text.lower():
-                            snippet = re.findall(r"[A-Z][^<>]{10,80}", s.text)
-                            matches = [{"text": snip, "winner": "?"} for snip in snippet[:limit]]
-                            break
-
-                await browser.close()
-                return matches
+            metrics.H2H_SECONDS.observe(time.perf_counter() - t0, source="playwright", result="ok" if matches else "empty")
+            return matches
 
         except Exception as e:
+            metrics.H2H_SECONDS.observe(time.perf_counter() - t0, source="playwright", result="error")
             print(f"⚠️ Ошибка Playwright: {e}")
             traceback.print_exc()
 
-    # Если ничего не вышло — fallback requests
+    # Если ничего не вышло — fallback на обычный HTTP-запрос
     print("🔁 Используем requests fallback...")
+    t0 = time.perf_counter()
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        resp = requests.get(url, headers=headers, timeout=15)
-        soup = BeautifulSoup(resp.text, "html.parser")
+        _, text = await fetch_text(url)
+        soup = _soup(text)
         matches = extract_matches_from_html(soup, team1, team2, limit)
+        metrics.H2H_SECONDS.observe(time.perf_counter() - t0, source="fallback", result="ok" if matches else "empty")
         print(f"✅ Найдено {len(matches)} матчей через requests fallback")
         return matches
     except Exception as e:
+        metrics.H2H_SECONDS.observe(time.perf_counter() - t0, source="fallback", result="error")
         print(f"❌ Ошибка requests fallback: {e}")
         traceback.print_exc()
         return []
 
 
 async def fetch_h2h_via_api(url, team1, team2, limit):
-    """Извлекает H2H напрямую из API Flashscore."""
+    """
+    Извлекает H2H напрямую из API Flashscore. [] — API ответил, но личных встреч нет;
+    None — API не ответил (ошибка, пустой ответ), есть смысл идти в браузер.
+    """
     try:
         match_id = re.search(r"match/([^/]+)/", url)
         if not match_id:
-            return []
+            return None
         match_id = match_id.group(1)
 
-        api_url = f"https://d.flashscore.com/x/feed/h2h_{match_id}_1_en_1"
-        headers = {"User-Agent": "Mozilla/5.0"}
-        r = requests.get(api_url, headers=headers, timeout=15)
+        api_url = f"{FLASHSCORE_FEED_URL}h2h_{match_id}_1_en_1"
+        status, text = await fetch_text(api_url, headers={"x-fsign": FLASHSCORE_FSIGN})
 
-        if r.status_code != 200 or not r.text.strip():
-            return []
+        if status != 200 or not text.strip():
+            return None
 
-        # Flashscore возвращает JSONP → чистим
-        data_raw = r.text.strip()
+        # Обычный ответ — фид "¬÷"
+        if is_feed(text):
+            return h2h_results_from_feed(text, limit)
+
+        # Старый формат: JSONP → чистим
+        data_raw = text.strip()
         data_clean = re.sub(r"^[^(]+\(|\);?$", "", data_raw)
         data = json.loads(data_clean)
 
         results = []
         for item in data.get("events", [])[:limit]:
             text = f"{item.get('T1', {}).get('Nm')} vs {item.get('T2', {}).get('Nm')} | {item.get('Sc', {}).get('FS')}"
-            winner = "Draw"
-            if team1 and team1.lower() in text.lower():
-                winner = team1
-            elif team2 and team2.lower() in text.lower():
-                winner = team2
-            results.append({"text": text, "winner": winner})
+            results.append({"text": text, "winner": winner_from_text(text, team1, team2)})
 
         return results
 
     except Exception as e:
         if DEBUG:
             print(f"⚠️ Ошибка API Flashscore: {e}")
-        return []
+        return None
+
+
+def h2h_results_from_feed(feed, limit):
+    """
+    Личные встречи из фида в формате {"text", "winner", ...}. Если секции есть, но
+    личных встреч среди них нет (команды не встречались) — пустой список: "Last matches"
+    это игры с другими соперниками. Все матчи берутся только из фида без заголовков KA.
+    """
+    matches = parse_h2h(feed, limit, section=H2H_SECTION_MARK)
+    if not matches and not has_sections(feed):
+        matches = parse_h2h(feed, limit)
+    resolver = get_resolver()
+    results = []
+    for m in matches:
+        resolver.add_participant(m.home, m.home_id)
+        resolver.add_participant(m.away, m.away_id)
+        item = m.to_dict()
+        item["text"] = f"{m.home} vs {m.away} | {m.score}"
+        item["winner_id"] = {1: m.home_id, 2: m.away_id}.get(m.winner)
+        item["winner"] = m.winner_name or "?"
+        results.append(item)
+    return results
+
+
+async def _load_directory_sport(sport, resolver, directory):
+    url = FLASHSCORE_FEED_URL + FLASHSCORE_LIST_FEED.format(sport=sport)
+    try:
+        status, text = await fetch_text(url, headers={"x-fsign": FLASHSCORE_FSIGN})
+    except Exception as e:
+        print(f"⚠️ Список матчей Flashscore ({sport}) недоступен: {e}")
+        return
+    if status != 200 or not is_feed(text):
+        return
+    for rec in iter_records(text):
+        match_id, home, away = rec.get(L_MATCH_ID), rec.get(L_HOME), rec.get(L_AWAY)
+        if not (match_id and home and away):
+            continue
+        home_id = rec.get(L_HOME_ID) or normalize(home)
+        away_id = rec.get(L_AWAY_ID) or normalize(away)
+        resolver.add_participant(home, home_id)
+        resolver.add_participant(away, away_id)
+        directory[frozenset((home_id, away_id))] = match_id
+
+
+async def _load_directory():
+    global _directory, _directory_at
+    resolver = get_resolver()
+    directory = {}
+    await asyncio.gather(*(_load_directory_sport(sport, resolver, directory) for sport in FLASHSCORE_SPORTS))
+    if directory:
+        _directory = directory
+    _directory_at = time.monotonic()
+    try:
+        await asyncio.to_thread(resolver.write, resolver.snapshot())
+    except OSError as e:
+        print(f"⚠️ Не удалось сохранить индекс команд: {e}")
+    return _directory
+
+
+async def refresh_match_directory(force: bool = False):
+    """
+    Сегодняшние матчи Flashscore: пары участников -> id матча; заодно пополняет индекс имён.
+    Устаревший справочник отдаётся сразу, а обновляется одной фоновой задачей; ждут её
+    только первый вызов (справочник ещё пуст) и force.
+    """
+    global _directory_task
+    if not force and time.monotonic() - _directory_at < DIRECTORY_TTL:
+        return _directory
+    if _directory_task is None or _directory_task.done():
+        _directory_task = asyncio.create_task(_load_directory())
+        _directory_task.add_done_callback(_directory_task_done)
+    if force or not _directory_at:
+        return await asyncio.shield(_directory_task)
+    return _directory
+
+
+def _directory_task_done(task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"⚠️ Обновление списка матчей Flashscore упало: {task.exception()}")
+
+
+async def resolve_match(team1, team2):
+    """(match_id, resolution1, resolution2) для пары названий букмекера; match_id None, если пара не найдена."""
+    await refresh_match_directory()
+    resolver = get_resolver()
+    r1 = resolver.resolve(team1)
+    r2 = resolver.resolve(team2)
+    if not r1 or not r2 or r1.participant_id == r2.participant_id:
+        return None, r1, r2
+    return _directory.get(frozenset((r1.participant_id, r2.participant_id))), r1, r2
+
+
+async def fetch_h2h_for_match(match_id, team1=None, team2=None, limit=5):
+    """
+    H2H по известному id матча: фид, а если API не ответил — браузер (H2H_BROWSER_FALLBACK).
+    Пустой ответ API (команды не встречались) в браузер не отправляется.
+    """
+    url = FLASHSCORE_MATCH_URL.format(match_id=match_id)
+    t0 = time.perf_counter()
+    matches = await fetch_h2h_via_api(url, team1, team2, limit)
+    result = "error" if matches is None else ("ok" if matches else "empty")
+    metrics.H2H_SECONDS.observe(time.perf_counter() - t0, source="api", result=result)
+    if matches is None and H2H_BROWSER_FALLBACK == "1":
+        return await fetch_h2h_browser(url, team1, team2, limit)
+    return matches or []
 
 
 def extract_matches_from_html(soup, team1, team2, limit):
@@ -125,18 +260,39 @@ def extract_matches_from_html(soup, team1, team2, limit):
             text = " ".join(row.stripped_strings)
             if not text:
                 continue
-            winner = "Draw"
-            if team1 and team1.lower() in text.lower():
-                winner = team1
-            elif team2 and team2.lower() in text.lower():
-                winner = team2
-            matches.append({"text": text, "winner": winner})
+            matches.append({"text": text, "winner": winner_from_text(text, team1, team2)})
     return matches
 
 
+def winner_from_text(text, team1, team2):
+    """
+    Победитель строки H2H по её тексту: team1/team2, "Draw" или "?" (неизвестно).
+    Нужны оба названия (первое — хозяева) и счёт; последний "x:y"/"x-y" в строке считается итоговым.
+    """
+    low = text.lower()
+    pos1 = low.find(team1.lower()) if team1 else -1
+    pos2 = low.find(team2.lower()) if team2 else -1
+    scores = re.findall(r"(\d+)\s*[:\-–]\s*(\d+)", text)
+    if pos1 < 0 or pos2 < 0 or not scores:
+        return "?"
+    home_goals, away_goals = (int(x) for x in scores[-1])
+    if home_goals == away_goals:
+        return "Draw"
+    home, away = (team1, team2) if pos1 < pos2 else (team2, team1)
+    return home if home_goals > away_goals else away
+
+
 if __name__ == "__main__":
     test_url = "https://www.flashscore.com/match/tennis/back-dayeon-WWkxyOw9/reyngold-ekaterina-lpjDUxQf/h2h/all-surfaces/?mid=xzFatGtA"
-    result = asyncio.run(fetch_h2h(test_url, "Back Dayeon", "Reyngold Ekaterina"))
+
+    async def _demo():
+        try:
+            return await fetch_h2h(test_url, "Back Dayeon", "Reyngold Ekaterina")
+        finally:
+            await shutdown_browser_pool()
+            await close_http_session()
+
+    result = asyncio.run(_demo())
     print("\n📊 Итоговый результат:")
     for r in result:
         print(" -", r)
@@ -0,0 +1,210 @@
+# team_resolver.py - bookmaker team names -> Flashscore participants (normalization, aliases, trigram index)
+import json
+import os
+import re
+import unicodedata
+
+TEAM_ALIASES_PATH = os.getenv("TEAM_ALIASES_PATH", "team_aliases.json")
+TEAM_MIN_CONFIDENCE = float(os.getenv("TEAM_MIN_CONFIDENCE", "0.6"))
+TEAM_LEARN_CONFIDENCE = float(os.getenv("TEAM_LEARN_CONFIDENCE", "0.85"))  # fuzzy hits above this become aliases
+
+_TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+    "є": "ye", "і": "i", "ї": "yi", "ґ": "g", "ß": "ss", "ø": "o", "æ": "ae", "œ": "oe", "ł": "l", "đ": "d",
+}
+_TRANSLIT_TABLE = str.maketrans(_TRANSLIT)
+_STOPWORDS = frozenset(("fc", "fk", "cf", "sc", "ac", "afc", "cd", "club", "klub"))
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+_TEAM_SEPARATOR = re.compile(r"\s+(?:[-–—@]|vs\.?|v)\s+", re.IGNORECASE)
+
+
+def normalize(name: str) -> str:
+    """Casefold, transliterate Cyrillic, strip accents and punctuation, drop club prefixes like "FC"."""
+    if not name:
+        return ""
+    # transliterate before NFKD, which would otherwise split "й" into "и" + breve
+    text = unicodedata.normalize("NFKD", name.casefold().translate(_TRANSLIT_TABLE))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    words = [w for w in _NON_ALNUM.sub(" ", text).split() if w not in _STOPWORDS]
+    return " ".join(words)
+
+
+def split_teams(title: str):
+    """"Team A — Team B" / "A vs B" / "A - B" -> (team1, team2); (None, None) if no separator."""
+    if not title:
+        return None, None
+    parts = [p.strip() for p in _TEAM_SEPARATOR.split(title, maxsplit=1)]
+    if len(parts) != 2 or not parts[0] or not parts[1]:
+        return None, None
+    return parts[0], parts[1]
+
+
+def trigrams(text: str):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Resolution:
+    __slots__ = ("participant_id", "name", "confidence", "source")
+
+    def __init__(self, participant_id, name, confidence, source):
+        self.participant_id = participant_id
+        self.name = name
+        self.confidence = confidence
+        self.source = source
+
+    def __repr__(self):
+        return f"Resolution({self.name!r}, id={self.participant_id}, {self.confidence:.2f}, {self.source})"
+
+
+class TrigramIndex:
+    """Fuzzy lookup over normalized participant names (Dice coefficient on character trigrams)."""
+
+    def __init__(self):
+        self._entries = []      # (normalized, participant_id, display name, trigram set)
+        self._by_key = {}       # normalized -> entry index
+        self._postings = {}     # trigram -> set of entry indexes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, name: str, participant_id: str, display: str = None):
+        key = normalize(name)
+        if not key:
+            return
+        if key in self._by_key:
+            i = self._by_key[key]
+            grams = self._entries[i][3]
+            self._entries[i] = (key, participant_id, display or name, grams)
+            return
+        grams = trigrams(key)
+        i = len(self._entries)
+        self._entries.append((key, participant_id, display or name, grams))
+        self._by_key[key] = i
+        for g in grams:
+            self._postings.setdefault(g, set()).add(i)
+
+    def exact(self, key: str):
+        i = self._by_key.get(key)
+        return None if i is None else self._entries[i]
+
+    def search(self, key: str, candidates: int = 20):
+        """Best (entry, score) for a normalized key, or (None, 0.0)."""
+        grams = trigrams(key)
+        counts = {}
+        for g in grams:
+            for i in self._postings.get(g, ()):
+                counts[i] = counts.get(i, 0) + 1
+        if not counts:
+            return None, 0.0
+        best, best_score = None, 0.0
+        for i, shared in sorted(counts.items(), key=lambda kv: -kv[1])[:candidates]:
+            entry = self._entries[i]
+            score = 2.0 * shared / (len(grams) + len(entry[3]))
+            if score > best_score:
+                best, best_score = entry, score
+        return best, best_score
+
+
+class TeamResolver:
+    """
+    Alias table (normalized bookmaker name -> participant) persisted as JSON,
+    backed by a trigram index of every Flashscore participant seen so far.
+    """
+
+    def __init__(self, path: str = TEAM_ALIASES_PATH, min_confidence: float = TEAM_MIN_CONFIDENCE,
+                 learn_confidence: float = TEAM_LEARN_CONFIDENCE):
+        self.path = path
+        self.min_confidence = min_confidence
+        self.learn_confidence = learn_confidence
+        self.index = TrigramIndex()
+        self.aliases = {}
+        self._dirty = False
+        self.stats = {"alias_hits": 0, "exact_hits": 0, "fuzzy_hits": 0, "unresolved": 0, "learned": 0}
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Team aliases not loaded from {self.path}: {e}")
+            return
+        self.aliases = data.get("aliases", {})
+        for pid, name in data.get("participants", {}).items():
+            self.index.add(name, pid)
+
+    def save(self):
+        self.write(self.snapshot())
+
+    def snapshot(self):
+        """Contents to save, taken on the caller's thread; None when nothing changed. Clears the dirty flag."""
+        if not self.path or not self._dirty:
+            return None
+        participants = {pid: display for _, pid, display, _ in self.index._entries if pid}
+        self._dirty = False
+        return {"aliases": dict(self.aliases), "participants": participants}
+
+    def write(self, data):
+        """Write a snapshot(); safe to run in a worker thread while the index keeps changing."""
+        if data is None:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"  # shard workers may save concurrently
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+        except OSError:
+            self._dirty = True
+            raise
+
+    def add_participant(self, name: str, participant_id: str):
+        if name and participant_id:
+            if self.index.exact(normalize(name)) is None:
+                self._dirty = True
+            self.index.add(name, participant_id)
+
+    def learn(self, bookmaker_name: str, participant_id: str, name: str):
+        key = normalize(bookmaker_name)
+        if key and self.aliases.get(key, {}).get("id") != participant_id:
+            self.aliases[key] = {"id": participant_id, "name": name}
+            self.stats["learned"] += 1
+            self._dirty = True
+
+    def resolve(self, name: str):
+        """Resolution for a bookmaker team name, or None below `min_confidence`."""
+        key = normalize(name)
+        if not key:
+            self.stats["unresolved"] += 1
+            return None
+        alias = self.aliases.get(key)
+        if alias:
+            self.stats["alias_hits"] += 1
+            return Resolution(alias["id"], alias.get("name"), 1.0, "alias")
+        entry = self.index.exact(key)
+        if entry is not None:
+            self.stats["exact_hits"] += 1
+            return Resolution(entry[1], entry[2], 1.0, "exact")
+        entry, score = self.index.search(key)
+        if entry is None or score < self.min_confidence:
+            self.stats["unresolved"] += 1
+            return None
+        self.stats["fuzzy_hits"] += 1
+        if score >= self.learn_confidence:
+            self.learn(name, entry[1], entry[2])
+        return Resolution(entry[1], entry[2], score, "fuzzy")
+
+
+_resolver = None
+
+
+def get_resolver() -> TeamResolver:
+    global _resolver
+    if _resolver is None:
+        _resolver = TeamResolver()
+    return _resolver
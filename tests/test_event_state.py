@@ -0,0 +1,29 @@
+# tests/test_event_state.py - EventStateStore signal dedupe
+from event_state import EventStateStore
+
+
+def _event():
+    return {"key": "1|1", "odds": 1.2, "score": "1:0"}
+
+
+def test_signal_sent_once_while_above_threshold():
+    store = EventStateStore(signal_delta=0.05)
+    ev = _event()
+    assert store.record(ev, 0.8, 0.7, now=0)
+    assert not store.record(ev, 0.81, 0.7, now=1)
+
+
+def test_deadline_fallback_does_not_reset_signal():
+    store = EventStateStore(signal_delta=0.05)
+    ev = _event()
+    assert store.record(ev, 0.8, 0.7, now=0)
+    assert not store.record(ev, 0.66, 0.7, final=False, now=1)
+    assert not store.record(ev, 0.8, 0.7, now=2)
+
+
+def test_final_drop_below_threshold_rearms_signal():
+    store = EventStateStore(signal_delta=0.05)
+    ev = _event()
+    assert store.record(ev, 0.8, 0.7, now=0)
+    assert not store.record(ev, 0.6, 0.7, now=1)
+    assert store.record(ev, 0.8, 0.7, now=2)
@@ -0,0 +1,46 @@
+# tests/test_h2h_cache.py - H2HCache refresh failures
+import asyncio
+
+from h2h_cache import H2HCache
+
+
+class Source:
+    def __init__(self, data=None, fail=False):
+        self.data = data
+        self.fail = fail
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("down")
+        return self.data
+
+
+def test_failed_refresh_keeps_stale_entry():
+    async def scenario():
+        cache = H2HCache(ttl=0.05, negative_ttl=60, stale_ttl=60, db_path="")
+        assert await cache.get("k", Source([1])) == [1]
+        await asyncio.sleep(0.06)
+        bad = Source(fail=True)
+        assert await cache.get("k", bad) == [1]
+        await asyncio.sleep(0.01)  # let the background refresh fail
+        for _ in range(3):
+            assert await cache.get("k", bad) == [1]
+        return bad.calls
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_failing_pair_past_stale_window_is_not_refetched_every_lookup():
+    async def scenario():
+        cache = H2HCache(ttl=0.02, negative_ttl=60, stale_ttl=0.02, db_path="")
+        assert await cache.get("k", Source([1])) == [1]
+        await asyncio.sleep(0.05)
+        bad = Source(fail=True)
+        results = [await cache.get("k", bad) for _ in range(5)]
+        return results, bad.calls
+
+    results, calls = asyncio.run(scenario())
+    assert results == [None] * 5
+    assert calls == 1
@@ -0,0 +1,16 @@
+# tests/test_match_predictor.py - H2H summaries only count rows with a known result
+from match_predictor import h2h_summary
+from team_resolver import Resolution
+
+R1 = Resolution("p1", "Alpha", 1.0, "test")
+R2 = Resolution("p2", "Beta", 1.0, "test")
+
+
+def test_uncreditable_rows_give_no_summary():
+    rows = [{"winner_id": "other", "winner": "Gamma"}, {"winner": "?"}]
+    assert h2h_summary(rows, R1, R2, "Alpha", "Beta") is None
+
+
+def test_total_counts_only_known_results():
+    rows = [{"winner_id": "p1"}, {"winner": "Draw"}, {"winner": "?"}, {"winner": "Beta"}]
+    assert h2h_summary(rows, R1, R2) == {"a_wins": 1, "b_wins": 1, "draws": 1, "total": 3}